@@ -9,22 +9,79 @@ Usage:
 """
 
 import argparse
-import json
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 # 添加 src 到 Python 路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+from common.jsonio import COMPACT_SUFFIXES, iter_json_array
 from packing.pack_builder import (
     PackConfig, 
     build_place, 
     build_map_place,
     build_content_pack, 
-    write_content_pack,
-    merge_places
+    merge_places,
+    write_content_pack
 )
 
+# 多进程构建的最小条目数：数据量较小时进程启动和序列化开销大于收益
+MIN_PARALLEL_ITEMS = 1024
+
+
+def _is_geocoded(item) -> bool:
+    """条目是否已成功编码（有 geocodeSuccess 标记或已带坐标）"""
+    return bool(item.get("geocodeSuccess") or (item.get("latitude") and item.get("longitude")))
+
+
+def build_item(item):
+    """
+    由单条地理编码结果构建 place（可在子进程中执行）
+    
+    调用方需先用 _is_geocoded 过滤掉编码失败的条目。
+    
+    Returns:
+        (place, note)
+    """
+    name = item.get("title") or item.get("name")
+    
+    # build_place 直接读取 latitude/longitude/locality/countryCode/formattedAddress 等字段，
+    # 无需为每条记录构造中间 geocode 字典
+    place = build_place(
+        name=name,
+        geocode_result=item,
+        client_id=item.get("clientId"),
+        synopsis=item.get("synopsis"),
+        timeline=item.get("timeline")
+    )
+    return place, item.get("synopsis") or item.get("note")
+
+
+def iter_built_places(input_path: str, workers: int = 1):
+    """
+    按输入顺序产出已编码条目的 (place, note)
+    
+    workers > 1 且条目数不少于 MIN_PARALLEL_ITEMS 时使用多进程构建，
+    否则逐条流式构建。
+    """
+    # 在读取阶段就丢弃编码失败的条目，后续构建与去重不再处理它们
+    geocoded = filter(_is_geocoded, iter_json_array(input_path))
+    
+    if workers <= 1:
+        for item in geocoded:
+            yield build_item(item)
+        return
+    
+    items = list(geocoded)
+    if len(items) < MIN_PARALLEL_ITEMS:
+        for item in items:
+            yield build_item(item)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        yield from ex.map(build_item, items, chunksize=256)
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -71,58 +128,74 @@ def main():
         choices=[1, 2],
         help="协议版本（1 或 2，默认: 1）"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"构建 place 的进程数（默认: 1；条目数不少于 {MIN_PARALLEL_ITEMS} 时生效）"
+    )
+    parser.add_argument(
+        "--dedupe-geo",
+        type=int,
+        metavar="PRECISION",
+        help="额外合并标题相同、坐标四舍五入到 PRECISION 位小数后相同的地点（如 4 ≈ 10 米）"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="输出紧凑 JSON（无缩进；输出文件以 .jsonl/.min.json 结尾时默认启用）"
+    )
     
     args = parser.parse_args()
+    compact = args.compact or args.out.endswith(COMPACT_SUFFIXES)
     
     try:
-        # 读取输入
-        with open(args.input, 'r', encoding='utf-8') as f:
-            items = json.load(f)
-        
-        # 构建 places
-        places = []
+        # 构建 places（逐条读取输入，按 clientId 边构建边去重）
+        places_by_cid = {}
         map_places = []
         order = 1
+        collisions = 0
         
-        for item in items:
-            # 跳过编码失败的
-            if not item.get("geocodeSuccess") and not (item.get("latitude") and item.get("longitude")):
-                continue
-            
-            # 构建 place
-            name = item.get("title") or item.get("name")
-            geocode = {
-                "lat": item.get("latitude"),
-                "lon": item.get("longitude"),
-                "locality": item.get("locality"),
-                "countryCode": item.get("countryCode"),
-                "display_name": item.get("formattedAddress"),
-                "osm_type": item.get("osm_type"),
-                "osm_id": item.get("osm_id"),
-            }
-            
-            place = build_place(
-                name=name,
-                geocode_result=geocode,
-                client_id=item.get("clientId"),
-                synopsis=item.get("synopsis"),
-                timeline=item.get("timeline")
-            )
-            
+        for place, note in iter_built_places(args.input, args.workers):
             if place:
-                places.append(place)
+                existing = places_by_cid.get(place["clientId"])
+                if existing is not None:
+                    # 重复地点：保留首次出现的记录，只补齐其缺失的字段（synopsis、timeline 等）
+                    for key, value in place.items():
+                        existing.setdefault(key, value)
+                    collisions += 1
+                    continue
+                places_by_cid[place["clientId"]] = place
                 
                 # 构建 mapPlace
                 map_place = build_map_place(
                     place_client_id=place["clientId"],
                     order_index=order,
-                    note=item.get("synopsis") or item.get("note")
+                    note=note
                 )
                 map_places.append(map_place)
                 order += 1
         
-        # 去重
-        places = merge_places(places)
+        places = list(places_by_cid.values())
+        
+        if args.dedupe_geo is not None:
+            # clientId 不同但标题与坐标相同的地点（如 OSM ID 与生成 ID）合并为首次出现的一个，
+            # 被合并地点的 mapPlace 改指向保留的地点，重复引用去掉后重新编号
+            aliases = {}
+            places = merge_places(places, geo_precision=args.dedupe_geo, aliases=aliases)
+            if aliases:
+                referenced = set()
+                kept_map_places = []
+                for map_place in map_places:
+                    cid = aliases.get(map_place["placeClientId"], map_place["placeClientId"])
+                    if cid in referenced:
+                        continue
+                    referenced.add(cid)
+                    map_place["placeClientId"] = cid
+                    map_place["orderIndex"] = len(kept_map_places) + 1
+                    kept_map_places.append(map_place)
+                map_places = kept_map_places
+                collisions += len(aliases)
         
         # 构建配置
         config = PackConfig(
@@ -142,12 +215,13 @@ def main():
         )
         
         # 写入文件
-        write_content_pack(content_pack, args.out)
+        write_content_pack(content_pack, args.out, compact=compact)
         
         print(f"\n✅ 内容包构建完成")
         print(f"   Pack ID: {args.pack_id}")
         print(f"   版本: {args.version}")
         print(f"   地点数: {len(places)}")
+        print(f"   合并重复: {collisions}")
         print(f"   输出文件: {args.out}")
         
     except Exception as e:
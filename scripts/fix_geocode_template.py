@@ -4,29 +4,41 @@
 地理编码修复脚本模板
 
 当自动地理编码返回错误结果时，使用此脚本进行手动修复。
-复制此文件到项目目录，根据实际情况修改 FIX_RULES。
+复制此文件（保留在 scripts/ 目录下，依赖 src/common 中的公共工具），根据实际情况修改 FIX_RULES。
 
 使用方法:
-    python fix_geocode.py --input geocoded.json --output fixed.json
+    python scripts/fix_geocode.py --input geocoded.json --output fixed.json
+
+    需要修复的地点会通过 aiohttp 并发查询（--concurrency 控制并发数，
+    --rate-limit 控制每秒请求数），依赖 requirements.txt 中的 aiohttp。
 
 示例 (繁花项目 - 上海地点):
     - 目标区域: 上海市
     - 坐标范围: 纬度 30-32°N, 经度 120-122°E
 """
 
-import json
+import asyncio
+import functools
+import os
+import sys
 import time
+import unicodedata
 import urllib.parse
-import urllib.request
 import argparse
 from typing import Dict, Any, Optional
 
+# 添加 src 到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from common.jsonio import dumps, load_json, loads
+from common.ratelimit import IntervalLimiter
+from common.tasks import run_bounded
+
 # ============================================================
 # 配置区域 - 根据项目修改
 # ============================================================
 
 # 高德 API Key (从环境变量获取更安全)
-import os
 AMAP_KEY = os.environ.get("AMAP_KEY", "your_amap_key_here")
 
 # 目标区域的坐标范围
@@ -36,6 +48,10 @@ VALID_LON_RANGE = (120, 122)  # 经度范围
 # 默认搜索城市
 DEFAULT_CITY = "上海"
 
+# 查询缓存: 反复调整 FIX_RULES 后重跑时，相同查询直接复用上次结果
+CACHE_PATH = "amap_fix_cache.json"
+NEGATIVE_CACHE_TTL = 86400  # 未找到结果的缓存有效期（秒），过期后重新查询
+
 # 手动修正规则: 地点名称 -> 更精确的查询词
 # 当某个地点无法自动正确解析时，添加规则
 FIX_RULES = {
@@ -78,38 +94,86 @@ MANUAL_COORDS = {
 # 核心函数
 # ============================================================
 
-def amap_search(query: str, city: str = DEFAULT_CITY) -> Optional[Dict]:
-    """使用高德 API 搜索地点"""
-    base = "https://restapi.amap.com/v3/place/text"
-    params = {
-        "key": AMAP_KEY,
-        "keywords": query,
-        "city": city,
-        "citylimit": "true",  # 关键: 限制搜索范围
-        "output": "JSON"
-    }
-    url = f"{base}?{urllib.parse.urlencode(params)}"
+@functools.lru_cache(maxsize=4096)
+def normalize_title(title: str) -> str:
+    """规范化地点名称（全角/半角、首尾空白、大小写），用于匹配修正规则"""
+    return unicodedata.normalize("NFKC", title.strip()).casefold()
+
+
+AMAP_SEARCH_URL = "https://restapi.amap.com/v3/place/text"
+
+# 默认城市的查询 URL 前缀（常量参数只编码一次），每次查询只需编码 keywords
+_SEARCH_URL_PREFIX = (
+    f"{AMAP_SEARCH_URL}?key={urllib.parse.quote(AMAP_KEY)}"
+    f"&city={urllib.parse.quote(DEFAULT_CITY)}"
+    "&citylimit=true&output=JSON&keywords="
+)
+
+# 规范化后的规则表，模块加载时构建一次
+_NORM_FIX_RULES = {normalize_title(k): v for k, v in FIX_RULES.items()}
+_NORM_MANUAL_COORDS = {normalize_title(k): v for k, v in MANUAL_COORDS.items()}
+
+
+def dump_json(obj: Any, path: str) -> None:
+    """写入 JSON 文件（缩进 2 格）"""
+    with open(path, "wb") as f:
+        f.write(dumps(obj, indent=True))
+
+
+async def amap_search(
+    session,
+    limiter: IntervalLimiter,
+    query: str,
+    city: str = DEFAULT_CITY,
+    cache: Optional[Dict[str, Any]] = None
+) -> Optional[Dict]:
+    """使用高德 API 搜索地点（cache 不为 None 时先查缓存）"""
+    cache_key = f"{city}|{query}"
+    if cache is not None and cache_key in cache:
+        entry = cache[cache_key]
+        if entry.get("result") is not None:
+            return entry["result"]
+        if time.time() - entry.get("ts", 0) < NEGATIVE_CACHE_TTL:
+            return None
+    
+    if city == DEFAULT_CITY:
+        url = _SEARCH_URL_PREFIX + urllib.parse.quote(query)
+    else:
+        params = {
+            "key": AMAP_KEY,
+            "city": city,
+            "citylimit": "true",  # 关键: 限制搜索范围
+            "output": "JSON",
+            "keywords": query,
+        }
+        url = f"{AMAP_SEARCH_URL}?{urllib.parse.urlencode(params)}"
     
     try:
-        with urllib.request.urlopen(url, timeout=10) as response:
-            data = json.loads(response.read())
-            if data.get("status") == "1" and data.get("pois"):
-                poi = data["pois"][0]
-                loc = poi.get("location", "")
-                if "," in loc:
-                    lon, lat = map(float, loc.split(","))
-                    return {
-                        "latitude": lat,
-                        "longitude": lon,
-                        "name": poi.get("name"),
-                        "address": poi.get("address"),
-                        "locality": poi.get("adname")
-                    }
+        await limiter.wait()  # API 限流
+        async with session.get(url) as response:
+            data = loads(await response.read())
     except Exception as e:
-        print(f"  ERROR: {e}")
+        # 网络错误不写缓存，下次运行重试
+        print(f"  ERROR ({query}): {e}")
+        return None
     
-    time.sleep(0.5)  # API 限流
-    return None
+    result = None
+    if data.get("status") == "1" and data.get("pois"):
+        poi = data["pois"][0]
+        loc = poi.get("location", "")
+        if "," in loc:
+            lon, lat = map(float, loc.split(","))
+            result = {
+                "latitude": lat,
+                "longitude": lon,
+                "name": poi.get("name"),
+                "address": poi.get("address"),
+                "locality": poi.get("adname")
+            }
+    
+    if cache is not None and (result is not None or data.get("status") == "1"):
+        cache[cache_key] = {"result": result, "ts": time.time()}
+    return result
 
 
 def is_in_valid_region(lat: float, lon: float) -> bool:
@@ -118,8 +182,28 @@ def is_in_valid_region(lat: float, lon: float) -> bool:
             VALID_LON_RANGE[0] <= lon <= VALID_LON_RANGE[1])
 
 
-def fix_place(item: Dict) -> Dict:
-    """修复单个地点的坐标"""
+def find_items_to_fix(data) -> list:
+    """一次遍历找出坐标缺失或超出有效区域的地点"""
+    lat_lo, lat_hi = VALID_LAT_RANGE
+    lon_lo, lon_hi = VALID_LON_RANGE
+    
+    todo = []
+    for item in data:
+        lat = item.get("latitude")
+        lon = item.get("longitude")
+        if not (lat and lon and lat_lo <= lat <= lat_hi and lon_lo <= lon <= lon_hi):
+            todo.append(item)
+    return todo
+
+
+async def fix_place(
+    session,
+    limiter: IntervalLimiter,
+    item: Dict,
+    cache: Optional[Dict[str, Any]] = None,
+    strict_keys: bool = False
+) -> Dict:
+    """修复单个地点的坐标（strict_keys=True 时按原始名称精确匹配规则）"""
     title = item.get("title", "")
     lat = item.get("latitude")
     lon = item.get("longitude")
@@ -128,50 +212,89 @@ def fix_place(item: Dict) -> Dict:
     if lat and lon and is_in_valid_region(lat, lon):
         return item  # 坐标正确，无需修复
     
-    print(f"\n修复: {title}")
-    print(f"  原坐标: ({lat}, {lon})")
-    
-    # 方法1: 检查手动坐标表
-    if title in MANUAL_COORDS:
-        manual = MANUAL_COORDS[title]
-        item["latitude"] = manual[0]
-        item["longitude"] = manual[1]
-        item["locality"] = manual[2]
-        item["fixMethod"] = "manual"
-        print(f"  ✓ 手动修复: ({manual[0]}, {manual[1]})")
-        return item
+    # 并发执行时日志先缓存，处理完一次性输出，避免不同地点的日志交错
+    log = [f"\n修复: {title}", f"  原坐标: ({lat}, {lon})"]
     
-    # 方法2: 使用修正规则重新查询
-    if title in FIX_RULES:
-        query = FIX_RULES[title]
-        print(f"  查询: {query}")
-        result = amap_search(query)
+    if strict_keys:
+        manual = MANUAL_COORDS.get(title)
+        rule_query = FIX_RULES.get(title)
+    else:
+        key = normalize_title(title)
+        manual = _NORM_MANUAL_COORDS.get(key)
+        rule_query = _NORM_FIX_RULES.get(key)
+    
+    try:
+        # 方法1: 检查手动坐标表
+        if manual:
+            item["latitude"] = manual[0]
+            item["longitude"] = manual[1]
+            item["locality"] = manual[2]
+            item["fixMethod"] = "manual"
+            log.append(f"  ✓ 手动修复: ({manual[0]}, {manual[1]})")
+            return item
+        
+        # 方法2: 使用修正规则重新查询
+        if rule_query:
+            query = rule_query
+            log.append(f"  查询: {query}")
+            result = await amap_search(session, limiter, query, cache=cache)
+            
+            if result and is_in_valid_region(result["latitude"], result["longitude"]):
+                item["latitude"] = result["latitude"]
+                item["longitude"] = result["longitude"]
+                item["locality"] = result.get("locality", "")
+                item["fixMethod"] = "rule_based"
+                log.append(f"  ✓ 规则修复: ({result['latitude']}, {result['longitude']})")
+                return item
+        
+        # 方法3: 尝试 title + 城市名
+        query = f"{title} {DEFAULT_CITY}"
+        log.append(f"  尝试: {query}")
+        result = await amap_search(session, limiter, query, cache=cache)
         
         if result and is_in_valid_region(result["latitude"], result["longitude"]):
             item["latitude"] = result["latitude"]
             item["longitude"] = result["longitude"]
             item["locality"] = result.get("locality", "")
-            item["fixMethod"] = "rule_based"
-            print(f"  ✓ 规则修复: ({result['latitude']}, {result['longitude']})")
+            item["fixMethod"] = "city_suffix"
+            log.append(f"  ✓ 城市后缀修复: ({result['latitude']}, {result['longitude']})")
             return item
-    
-    # 方法3: 尝试 title + 城市名
-    query = f"{title} {DEFAULT_CITY}"
-    print(f"  尝试: {query}")
-    result = amap_search(query)
-    
-    if result and is_in_valid_region(result["latitude"], result["longitude"]):
-        item["latitude"] = result["latitude"]
-        item["longitude"] = result["longitude"]
-        item["locality"] = result.get("locality", "")
-        item["fixMethod"] = "city_suffix"
-        print(f"  ✓ 城市后缀修复: ({result['latitude']}, {result['longitude']})")
+        
+        # 修复失败
+        log.append(f"  ✗ 修复失败，需要手动处理")
+        item["fixMethod"] = "failed"
         return item
+    finally:
+        print("\n".join(log))
+
+
+async def fix_places(
+    items,
+    concurrency: int,
+    rate_limit: Optional[float],
+    cache: Optional[Dict[str, Any]] = None,
+    strict_keys: bool = False
+) -> None:
+    """并发修复多个地点（共享连接、限流器）"""
+    import aiohttp
     
-    # 修复失败
-    print(f"  ✗ 修复失败，需要手动处理")
-    item["fixMethod"] = "failed"
-    return item
+    limiter = IntervalLimiter(1.0 / rate_limit if rate_limit and rate_limit > 0 else 0.0)
+    timeout = aiohttp.ClientTimeout(total=10)
+    # 所有请求都发往同一主机：连接池大小与并发数一致，保持长连接并缓存 DNS，
+    # 避免每次查询重新握手 TCP/TLS
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        keepalive_timeout=30,
+        ttl_dns_cache=300,
+    )
+    
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # 同时在途的查询不超过 concurrency 个，协程在有空位时才创建
+        await run_bounded(
+            (fix_place(session, limiter, item, cache, strict_keys) for item in items),
+            concurrency,
+        )
 
 
 def main():
@@ -179,32 +302,45 @@ def main():
     parser.add_argument("--input", "-i", required=True, help="输入 JSON 文件")
     parser.add_argument("--output", "-o", required=True, help="输出 JSON 文件")
     parser.add_argument("--dry-run", action="store_true", help="只检查，不修复")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发请求数（默认: 8）")
+    parser.add_argument("--rate-limit", type=float, default=2.0, help="API 请求速率限制 (rps，默认: 2)")
+    parser.add_argument("--cache", default=CACHE_PATH, help=f"查询缓存文件（默认: {CACHE_PATH}）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写查询缓存")
+    parser.add_argument("--strict-keys", action="store_true", help="按原始名称精确匹配 FIX_RULES/MANUAL_COORDS（不做规范化）")
     args = parser.parse_args()
     
     # 读取数据
-    with open(args.input, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = load_json(args.input)
     
     # 统计
     total = len(data)
-    need_fix = 0
     fixed = 0
     failed = 0
     
-    # 处理每个地点
-    for item in data:
-        lat = item.get("latitude")
-        lon = item.get("longitude")
+    # 找出需要修复的地点
+    todo = find_items_to_fix(data)
+    need_fix = len(todo)
+    
+    # 并发修复
+    if todo and not args.dry_run:
+        cache = None
+        if not args.no_cache:
+            cache = {}
+            if os.path.exists(args.cache):
+                try:
+                    cache = load_json(args.cache)
+                except Exception:
+                    pass
         
-        if not (lat and lon and is_in_valid_region(lat, lon)):
-            need_fix += 1
-            
-            if not args.dry_run:
-                fix_place(item)
-                if item.get("fixMethod") != "failed":
-                    fixed += 1
-                else:
-                    failed += 1
+        asyncio.run(fix_places(todo, args.concurrency, args.rate_limit, cache, args.strict_keys))
+        
+        if cache is not None:
+            dump_json(cache, args.cache)
+        for item in todo:
+            if item.get("fixMethod") != "failed":
+                fixed += 1
+            else:
+                failed += 1
     
     # 输出结果
     print(f"\n{'='*50}")
@@ -216,8 +352,7 @@ def main():
         print(f"修复失败: {failed} 个")
         
         # 保存结果
-        with open(args.output, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        dump_json(data, args.output)
         print(f"\n结果已保存到: {args.output}")
     
     # 列出失败的地点
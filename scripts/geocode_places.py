@@ -9,17 +9,50 @@ Usage:
 """
 
 import argparse
-import json
+import asyncio
 import sys
 import os
+from collections import defaultdict
 
 # 添加 src 到 Python 路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from geocoding.nominatim import geocode_batch, generate_client_id
+from common.jsonio import COMPACT_SUFFIXES, dumps, iter_json_array
+from geocoding.nominatim import geocode_batch, geocode_batch_async, generate_client_id
 from geocoding.validator import parse_address_levels, validate_geocode_result
 
 
+class JsonArrayWriter:
+    """逐条写入 JSON 数组，默认输出格式与 json.dump(..., indent=2) 一致"""
+
+    def __init__(self, path: str, compact: bool = False):
+        self.f = open(path, 'wb')
+        self.compact = compact
+        self.count = 0
+
+    def write(self, item) -> None:
+        if self.compact:
+            self.f.write(b'[' if self.count == 0 else b',')
+            self.f.write(dumps(item))
+        else:
+            self.f.write(b'[\n  ' if self.count == 0 else b',\n  ')
+            self.f.write(dumps(item, indent=True).replace(b'\n', b'\n  '))
+        self.count += 1
+
+    def close(self) -> None:
+        if not self.count:
+            self.f.write(b'[]')
+        else:
+            self.f.write(b']' if self.compact else b'\n]')
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="对地名进行地理编码"
@@ -45,69 +78,99 @@ def main():
         default=1.0,
         help="请求间隔秒数（默认: 1.0）"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="并发编码 worker 数（默认: 1；公共 Nominatim 服务请保持 1，自建实例可调大）"
+    )
     parser.add_argument(
         "--validate",
         action="store_true",
         help="启用结果验证"
     )
+    parser.add_argument(
+        "--copy-items",
+        action="store_true",
+        help="输出时复制输入条目而不是原地补充字段"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="输出紧凑 JSON（无缩进；输出文件以 .jsonl/.min.json 结尾时默认启用）"
+    )
     
     args = parser.parse_args()
+    compact = args.compact or args.out.endswith(COMPACT_SUFFIXES)
     
     try:
-        # 读取输入
-        with open(args.input, 'r', encoding='utf-8') as f:
-            items = json.load(f)
-        
-        # 提取地名
-        names = []
-        for item in items:
+        # 按地名分组（一次扫描完成提取与去重，分组键顺序即首次出现顺序）
+        groups = defaultdict(list)
+        output_items = []
+        dropped = 0
+        for item in iter_json_array(args.input):
             name = item.get("title") or item.get("name") or item.get("address")
-            if name:
-                names.append(name)
+            if not name:
+                dropped += 1
+                continue
+            # 默认直接在输入条目上补充字段，避免逐条复制字典
+            output_item = {**item} if args.copy_items else item
+            groups[name].append(output_item)
+            output_items.append(output_item)
+        if dropped:
+            print(f"跳过无地名条目: {dropped} 个")
         
-        names = list(set(names))  # 去重
+        names = list(groups)
         print(f"待编码地名: {len(names)} 个")
         
         # 批量编码
-        results = geocode_batch(names, args.cache, args.sleep)
+        if args.workers > 1:
+            results = asyncio.run(
+                geocode_batch_async(names, args.cache, args.sleep, workers=args.workers)
+            )
+        else:
+            results = geocode_batch(names, args.cache, args.sleep)
         
-        # 构建输出
-        output = []
+        # 每个唯一地名只生成一次 clientId
+        client_ids = {
+            name: generate_client_id(results[name], name)
+            for name in names if results.get(name)
+        }
+        
+        # 按组回填结果：同名条目共享同一次查表
         success = 0
         failed = 0
         
-        for item in items:
-            name = item.get("title") or item.get("name") or item.get("address")
+        for name, group in groups.items():
             geocode = results.get(name)
+            if not geocode:
+                for output_item in group:
+                    output_item["geocodeSuccess"] = False
+                failed += len(group)
+                continue
             
-            output_item = {**item}
-            
-            if geocode:
+            client_id = client_ids[name]
+            for output_item in group:
                 output_item["latitude"] = geocode["lat"]
                 output_item["longitude"] = geocode["lon"]
                 output_item["locality"] = geocode.get("locality")
                 output_item["countryCode"] = geocode.get("countryCode")
                 output_item["formattedAddress"] = geocode.get("display_name")
-                output_item["clientId"] = generate_client_id(geocode, name)
+                output_item["clientId"] = client_id
                 output_item["geocodeSuccess"] = True
                 
                 # 验证
-                if args.validate and item.get("address"):
-                    levels = parse_address_levels(item["address"])
+                if args.validate and output_item.get("address"):
+                    levels = parse_address_levels(output_item["address"])
                     validation = validate_geocode_result(levels, output_item)
                     output_item["validationPassed"] = validation["validation_passed"]
-                
-                success += 1
-            else:
-                output_item["geocodeSuccess"] = False
-                failed += 1
-            
-            output.append(output_item)
+            success += len(group)
         
-        # 写入输出
+        # 按输入顺序逐条写出
         os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
-        with open(args.out, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        with JsonArrayWriter(args.out, compact=compact) as writer:
+            for output_item in output_items:
+                writer.write(output_item)
         
         print(f"\n✅ 地理编码完成")
         print(f"   成功: {success}")
@@ -15,32 +15,44 @@ Usage:
 
 import argparse
 import asyncio
-import json
 import os
 import sys
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, List
 
 # 添加 src 到 Python 路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from processing.merger import merge_by_title
 from processing.cleaner import run_batches, APIConfig
-from processing.filter import filter_items
+from processing.filter import iter_filtered
+from common.jsonio import dumps, load_json, loads
+
+# JSONL 读写缓冲区大小（64 KB），减少大文件逐行读写的系统调用次数
+IO_BUFFER_SIZE = 1 << 16
+
+
+def dump_json(obj: Any, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(dumps(obj, indent=True))
 
 
 def load_jsonl(path: str) -> List[Dict[str, Any]]:
     items = []
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "rb", buffering=IO_BUFFER_SIZE) as f:
         for line in f:
             if line.strip():
-                items.append(json.loads(line))
+                items.append(loads(line))
     return items
 
 
-def save_jsonl(path: str, items: List[Dict[str, Any]]) -> None:
-    with open(path, "w", encoding="utf-8") as f:
+def save_jsonl(path: str, items: Iterable[Dict[str, Any]]) -> int:
+    """逐条写入 JSONL（可直接消费生成器），返回写入条数"""
+    count = 0
+    with open(path, "wb", buffering=IO_BUFFER_SIZE) as f:
         for item in items:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.write(dumps(item, newline=True))
+            count += 1
+    return count
 
 
 async def async_main(args):
@@ -53,8 +65,7 @@ async def async_main(args):
     # 可选：保存合并后的中间结果
     if args.save_intermediate:
         mid_path = args.output + ".merged.json"
-        with open(mid_path, "w", encoding="utf-8") as f:
-            json.dump(merged_items, f, indent=2, ensure_ascii=False)
+        dump_json(merged_items, mid_path)
         print(f"saved intermediate merged data to {mid_path}")
 
     # 2. Cleaner
@@ -101,20 +112,17 @@ async def async_main(args):
     
     # Load cleaned items
     if os.path.exists(temp_cleaned):
-        with open(temp_cleaned, "r", encoding="utf-8") as f:
-            cleaned_items = json.load(f)
+        cleaned_items = load_json(temp_cleaned)
         print(f"Cleaned {len(cleaned_items)} places.")
     else:
         print("Error: Cleaning failed, output file not found.")
         sys.exit(1)
 
     # 3. Filter
+    # 过滤结果直接流式写出，不再生成完整的中间列表
     print("=== Stage 3: Filtering invalid places ===")
-    final_items = filter_items(cleaned_items)
-    print(f"Filtered down to {len(final_items)} valid places.")
-    
-    # Save final output
-    save_jsonl(args.output, final_items)
+    kept = save_jsonl(args.output, iter_filtered(cleaned_items))
+    print(f"Filtered down to {kept} valid places.")
     print(f"=== Done! Saved result to {args.output} ===")
 
 
@@ -53,6 +53,20 @@ def main():
         default=1.0,
         help="请求间隔秒数（默认: 1.0）"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="最大并发请求数（默认: 4）"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="抽取结果缓存目录（相同模型、提示词与文本命中缓存时不再请求 API）"
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="输出带缩进的 JSON（默认紧凑输出）"
+    )
     parser.add_argument(
         "--no-skip",
         action="store_true",
@@ -77,7 +91,10 @@ def main():
             args.out, 
             config,
             rate_limit_delay=args.rate_limit,
-            skip_existing=not args.no_skip
+            skip_existing=not args.no_skip,
+            concurrency=args.concurrency,
+            cache_dir=args.cache_dir,
+            pretty=args.pretty
         )
         print(f"\n✅ 抽取完成")
         print(f"   总任务数: {result['total']}")
@@ -0,0 +1 @@
+# 公共工具模块
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON 读写工具（各模块与命令行脚本共用）
+
+orjson 与 ijson 均为可选依赖，未安装时回退到标准库 json 并整体读入。
+loads/dumps 在两种实现下行为一致：输出 UTF-8 字节串、非 ASCII 字符不转义、
+非字符串键转为字符串，紧凑格式无多余空格，缩进格式与 json.dump(..., indent=2) 相同。
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from typing import Any, Iterator
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson 为可选依赖，未安装时整体读入
+    ijson = None
+
+# 超过该大小（16 MB）的输入通过 mmap 交给 orjson 解析，避免额外复制一份文件内容
+MMAP_THRESHOLD = 16 * 2 ** 20
+
+# 以这些后缀结尾的输出默认为仅供程序读取的中间文件，使用紧凑 JSON
+COMPACT_SUFFIXES = (".jsonl", ".min.json")
+
+
+def loads(data: Any) -> Any:
+    """解析 JSON（str、bytes 或 memoryview）；orjson.JSONDecodeError 是 json.JSONDecodeError 的子类"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False, newline: bool = False) -> bytes:
+    """序列化为 UTF-8 JSON 字节串（可选缩进 2 格与行尾换行）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if newline:
+            option |= orjson.OPT_APPEND_NEWLINE
+        return orjson.dumps(obj, option=option)
+    if indent:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    return (text + '\n' if newline else text).encode('utf-8')
+
+
+def load_json(path: str) -> Any:
+    """读取 JSON 文件（优先使用 orjson）"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as buf:
+                        return orjson.loads(buf)
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_json_array(path: str) -> Iterator[Any]:
+    """逐条读取 JSON 数组（安装 ijson 时流式解析，不整体读入原文）"""
+    if ijson is not None:
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+        return
+    yield from load_json(path)
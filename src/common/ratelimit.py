@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求间隔限速器（extraction 与 geocoding 共用）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+
+class IntervalLimiter:
+    """
+    保证相邻请求至少间隔 interval 秒（interval 为 0 时不限速）
+
+    每次调用预约下一个可用时间点后再等待，临界区内不睡眠；
+    同一实例可在协程中 await wait()，也可在多个线程中调用 wait_blocking()。
+    """
+
+    def __init__(self, interval: float):
+        self.interval = max(interval or 0.0, 0.0)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """预约下一个时间点，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            return slot - now
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_blocking(self) -> None:
+        if not self.interval:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
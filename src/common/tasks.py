@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+有界并发的协程任务调度（extraction 与 processing 共用）
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Iterable, Set
+
+try:
+    _ExceptionGroup = BaseExceptionGroup
+except NameError:  # Python 3.11 之前没有异常组，多个失败时只抛出第一个
+    _ExceptionGroup = None
+
+
+def _raise_failures(done: Set[asyncio.Future]) -> None:
+    """取回 done 中每个任务的异常（避免 “exception was never retrieved”），有失败时抛出"""
+    errors = [e for e in (t.exception() for t in done if not t.cancelled()) if e is not None]
+    if not errors:
+        return
+    if len(errors) == 1 or _ExceptionGroup is None:
+        raise errors[0]
+    raise _ExceptionGroup(f"{len(errors)} 个任务失败", errors)
+
+
+async def run_bounded(coros: Iterable[Awaitable], max_pending: int) -> None:
+    """
+    依次启动 coros 中的协程，同时在途的任务不超过 max_pending 个
+
+    coros 可以是惰性迭代器，协程在有空位时才被取出。
+    任一任务抛出异常时取消其余在途任务并等待其结束，再把该异常抛给调用方
+    （同一轮有多个任务失败时抛出包含全部异常的 ExceptionGroup），
+    不会留下无人回收异常的任务。
+    """
+    max_pending = max(1, max_pending)
+    pending: Set[asyncio.Future] = set()
+    try:
+        for coro in coros:
+            if len(pending) >= max_pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                _raise_failures(done)
+            pending.add(asyncio.ensure_future(coro))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            _raise_failures(done)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
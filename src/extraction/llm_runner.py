@@ -15,14 +15,41 @@ LLM 抽取执行器 - 调用 LLM API 执行文本信息抽取
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import itertools
 import json
 import os
+import sys
+import re
+import threading
 import time
 import urllib.request
 import urllib.error
-from typing import Dict, List, Optional, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 from dataclasses import dataclass
 
+try:
+    from ..common.jsonio import dumps as _dumps, loads as _loads
+    from ..common.ratelimit import IntervalLimiter
+    from ..common.tasks import run_bounded
+except ImportError:  # 以脚本方式运行或以 src 为导入根时没有上级包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.jsonio import dumps as _dumps, loads as _loads
+    from common.ratelimit import IntervalLimiter
+    from common.tasks import run_bounded
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # requests 未安装时回退到 urllib（每次请求新建连接）
+    requests = None
+
+
+# 提示词版本：修改系统提示词模板时递增，使旧的抽取缓存失效
+PROMPT_VERSION = "1"
+
 
 @dataclass
 class LLMConfig:
@@ -34,84 +61,272 @@ class LLMConfig:
     timeout: int = 60
     retry_count: int = 3
     retry_delay: float = 2.0
+    pool_maxsize: int = 32  # 连接池大小，应不小于并发请求数
+    batch_size: int = 1  # 每次请求打包的分片数，上下文窗口较大的模型可调大
+    concurrency: int = 4  # 最大并发请求数
+
+
+# 可选的 markdown 代码块标记：开头 ```json 或 ```，结尾 ```
+_FENCE_RE = re.compile(r"^(?:```(?:json)?)?(.*?)(?:```)?$", re.DOTALL)
 
 
 def clean_json_response(content: str) -> str:
     """清理 LLM 返回的 JSON 内容（移除 markdown 代码块标记）"""
-    content = content.strip()
+    return _FENCE_RE.match(content.strip()).group(1).strip()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """先写临时文件再 os.replace，进程中断时不会留下半截文件"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _matches_schema(value: Any, schema: Any) -> bool:
+    """粗略检查结果结构是否与 schema 一致（只比较顶层字段的容器类型）"""
+    if not isinstance(value, dict):
+        return False
+    if not isinstance(schema, dict):
+        return True
+    for key, expected in schema.items():
+        actual = value.get(key)
+        if actual is None:
+            continue
+        if isinstance(expected, list) and not isinstance(actual, list):
+            return False
+        if isinstance(expected, dict) and not isinstance(actual, dict):
+            return False
+    return True
+
+
+class ExtractionCache:
+    """
+    内容寻址的抽取结果缓存
+    
+    键为 (接口地址, 模型, 提示词版本, 系统提示词, 文本) 的 sha256，
+    系统提示词已包含指令与 schema，
+    各字段前加 8 字节长度前缀，避免字段拼接产生歧义。每条结果单独存为
+    <cache_dir>/<键前两位>/<键>.json，附带写入时间（UTC）便于追溯。
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._created_dirs = set()  # 已创建的分片目录，每个只 makedirs 一次
+    
+    @staticmethod
+    def make_key(config: LLMConfig, system_prompt: str, text: str) -> str:
+        """计算缓存键"""
+        h = hashlib.sha256()
+        for part in (config.base_url, config.model, PROMPT_VERSION, system_prompt, text):
+            b = part.encode("utf-8")
+            h.update(len(b).to_bytes(8, "little"))
+            h.update(b)
+        return h.hexdigest()
     
-    # 移除开头的 markdown 代码块标记
-    if content.startswith("```json"):
-        content = content[7:]
-    elif content.startswith("```"):
-        content = content[3:]
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
     
-    # 移除结尾的 markdown 代码块标记
-    if content.endswith("```"):
-        content = content[:-3]
+    def get(self, key: str, schema: Optional[dict] = None) -> Optional[Dict]:
+        """读取缓存结果；结构与 schema 不符的条目会被删除并视为未命中"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = _loads(f.read()).get("value")
+        except (OSError, ValueError, AttributeError):
+            return None
+        
+        if not _matches_schema(value, schema):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        
+        return value
     
-    return content.strip()
+    def put(self, key: str, value: Dict, meta: Optional[Dict] = None) -> None:
+        """写入缓存结果"""
+        path = self._path(key)
+        shard = os.path.dirname(path)
+        if shard not in self._created_dirs:
+            os.makedirs(shard, exist_ok=True)
+            self._created_dirs.add(shard)
+        entry = {
+            "key": key,
+            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "meta": meta or {},
+            "value": value,
+        }
+        _write_atomic(path, _dumps(entry))
+
+
+def build_system_prompt(instructions: str, schema: dict) -> str:
+    """
+    构建系统提示词（同一批次的指令和 schema 相同，只需构建一次）
+    
+    系统提示词放在分片文本之前且逐字节不变，支持提示词缓存的服务端可以复用
+    这部分前缀；配合较低的 temperature 使用效果更好。
+    """
+    return (
+        f"{instructions}\n\n"
+        "IMPORTANT: You must output ONLY valid JSON. No markdown code blocks, no explanations.\n"
+        f"Strictly follow this schema:\n{json.dumps(schema, ensure_ascii=False, indent=2)}"
+    )
+
+
+def build_request(
+    text: str,
+    system_prompt: str,
+    config: LLMConfig
+) -> Tuple[Dict, Dict]:
+    """构建请求头与请求体，返回 (headers, data)"""
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {config.api_key}"
+    }
+    
+    data = {
+        "model": config.model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+        "temperature": config.temperature
+    }
+    return headers, data
+
+
+# 模块级共享会话：连续请求复用同一 TCP/TLS 连接，避免每次重新握手
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _get_session(pool_maxsize: int):
+    """获取（首次调用时创建）共享的 requests 会话"""
+    global _SESSION
+    if _SESSION is None:
+        # 线程池模式下可能有多个线程同时首次调用
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
+
+
+def _post_json(data: Dict, headers: Dict, config: LLMConfig) -> Tuple[int, bytes]:
+    """发送 POST 请求，返回 (状态码, 响应体)"""
+    body = _dumps(data)
+    if requests is not None:
+        response = _get_session(config.pool_maxsize).post(
+            config.base_url, data=body, headers=headers, timeout=config.timeout
+        )
+        return response.status_code, response.content
+    
+    req = urllib.request.Request(
+        config.base_url, 
+        data=body, 
+        headers=headers
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=config.timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _parse_output(content: str, schema: dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """解析模型输出，返回 (结果, 错误说明)；成功时错误说明为 None"""
+    try:
+        parsed = _loads(clean_json_response(content))
+    except json.JSONDecodeError as e:
+        return None, f"Your output failed to parse as JSON: {e}"
+    if not _matches_schema(parsed, schema):
+        return None, "Your output does not match the structure of the schema"
+    return parsed, None
+
+
+def _add_feedback(messages: List[Dict], content: str, error: str) -> None:
+    """将上一次的输出和错误说明追加到对话中，供重试时参考"""
+    messages.append({"role": "assistant", "content": content})
+    messages.append({
+        "role": "user",
+        "content": f"{error}. Output ONLY valid JSON matching the schema."
+    })
 
 
 def call_llm(
     text: str, 
-    instructions: str, 
+    instructions: Optional[str], 
     schema: dict,
-    config: LLMConfig
+    config: LLMConfig,
+    cache: Optional[ExtractionCache] = None,
+    system_prompt: Optional[str] = None,
+    cache_key: Optional[str] = None
 ) -> Optional[Dict]:
     """
     调用 LLM API
     
     Args:
         text: 输入文本
-        instructions: 抽取指令
+        instructions: 抽取指令（提供 system_prompt 时可为 None）
         schema: 输出 schema
         config: LLM 配置
+        cache: 抽取缓存（命中时不发请求）
+        system_prompt: 预先构建的系统提示词（为 None 时由 instructions 和 schema 构建）
+        cache_key: 调用方已计算缓存键并查过缓存时传入，跳过内部查找，只用于写入结果
     
     Returns:
         解析后的 JSON 结果，失败返回 None
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {config.api_key}"
-    }
+    if system_prompt is None:
+        system_prompt = build_system_prompt(instructions, schema)
     
-    # 构建系统提示词
-    system_prompt = (
-        f"{instructions}\n\n"
-        "IMPORTANT: You must output ONLY valid JSON. No markdown code blocks, no explanations.\n"
-        f"Strictly follow this schema:\n{json.dumps(schema, ensure_ascii=False, indent=2)}"
-    )
+    key = None
+    if cache is not None:
+        key = cache_key
+        if key is None:
+            key = cache.make_key(config, system_prompt, text)
+            cached = cache.get(key, schema)
+            if cached is not None:
+                return cached
     
-    data = {
-        "model": config.model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": text}
-        ],
-        "temperature": config.temperature
-    }
+    headers, data = build_request(text, system_prompt, config)
     
     for attempt in range(config.retry_count):
         try:
-            req = urllib.request.Request(
-                config.base_url, 
-                data=json.dumps(data).encode('utf-8'), 
-                headers=headers
-            )
-            
-            with urllib.request.urlopen(req, timeout=config.timeout) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                content = result['choices'][0]['message']['content']
-                content = clean_json_response(content)
-                return json.loads(content)
+            status, body = _post_json(data, headers, config)
+            if status != 200:
+                print(f"HTTP Error {status} (attempt {attempt + 1}): {body.decode('utf-8', 'replace')}")
                 
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
-            print(f"HTTP Error {e.code} (attempt {attempt + 1}): {error_body}")
+                # 429 或 5xx 错误时重试
+                if status in (429, 500, 502, 503, 504):
+                    time.sleep(config.retry_delay * (attempt + 1))
+                    continue
+                return None
             
-            # 429 或 5xx 错误时重试
-            if e.code in (429, 500, 502, 503, 504):
+            result = _loads(body)
+            content = result['choices'][0]['message']['content']
+            parsed, error = _parse_output(content, schema)
+            if error is None:
+                if key is not None:
+                    cache.put(key, parsed, {"model": config.model, "promptVersion": PROMPT_VERSION})
+                return parsed
+            
+            # 输出无法解析或与 schema 不符：把错误反馈给模型后重试，而不是原样重发
+            print(f"Invalid output (attempt {attempt + 1}): {error}")
+            if attempt < config.retry_count - 1:
+                _add_feedback(data["messages"], content, error)
                 time.sleep(config.retry_delay * (attempt + 1))
                 continue
             return None
@@ -133,22 +348,333 @@ def call_llm(
     return None
 
 
+# 批量请求时追加到系统提示词末尾的说明
+BATCH_INSTRUCTIONS = (
+    "\n\nThe user message contains several text chunks, each starting with a line "
+    "\"===CHUNK n===\" (n starts at 1). Apply the extraction above to each chunk separately "
+    "and return one entry per chunk in \"results\", with \"chunkIndex\" set to the chunk number."
+)
+
+
+def build_batch_schema(schema: dict) -> dict:
+    """将单个分片的 schema 包装为批量输出 schema"""
+    return {"results": [{"chunkIndex": 1, "output": schema}]}
+
+
+def join_batch_texts(texts: List[str]) -> str:
+    """将多个分片文本拼接为一条用户消息"""
+    return "\n".join(f"===CHUNK {i}===\n{text}" for i, text in enumerate(texts, start=1))
+
+
+def split_batch_result(result: Optional[Dict], count: int) -> List[Optional[Dict]]:
+    """
+    按 chunkIndex 拆分批量结果
+    
+    Returns:
+        长度为 count 的列表，缺失或无效的分片为 None
+    """
+    outputs: List[Optional[Dict]] = [None] * count
+    entries = result.get("results") if isinstance(result, dict) else None
+    if not isinstance(entries, list):
+        return outputs
+    
+    for pos, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        idx = entry.get("chunkIndex")
+        # 缺少 chunkIndex 时按顺序对应
+        idx = idx - 1 if isinstance(idx, int) else pos
+        if 0 <= idx < count and isinstance(entry.get("output"), dict):
+            outputs[idx] = entry["output"]
+    return outputs
+
+
+def _group_tasks(tasks: Iterable[Tuple], batch_size: int) -> Iterator[List[Tuple]]:
+    """将任务按 batch_size 分组；系统提示词变化时提前结束当前组"""
+    batch: List[Tuple] = []
+    for task in tasks:
+        if batch and (len(batch) >= batch_size or task[4] is not batch[0][4]):
+            yield batch
+            batch = []
+        batch.append(task)
+    if batch:
+        yield batch
+
+
+async def call_llm_async(
+    session,
+    text: str,
+    instructions: Optional[str],
+    schema: dict,
+    config: LLMConfig,
+    cache: Optional[ExtractionCache] = None,
+    system_prompt: Optional[str] = None,
+    cache_key: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    异步调用 LLM API（与 call_llm 相同的重试策略，共享 aiohttp 会话）
+    
+    Args:
+        session: aiohttp.ClientSession
+        text: 输入文本
+        instructions: 抽取指令（提供 system_prompt 时可为 None）
+        schema: 输出 schema
+        config: LLM 配置
+        cache: 抽取缓存（命中时不发请求）
+        system_prompt: 预先构建的系统提示词（为 None 时由 instructions 和 schema 构建）
+        cache_key: 调用方已计算缓存键并查过缓存时传入，跳过内部查找，只用于写入结果
+    
+    Returns:
+        解析后的 JSON 结果，失败返回 None
+    """
+    if system_prompt is None:
+        system_prompt = build_system_prompt(instructions, schema)
+    
+    key = None
+    if cache is not None:
+        key = cache_key
+        if key is None:
+            key = cache.make_key(config, system_prompt, text)
+            cached = cache.get(key, schema)
+            if cached is not None:
+                return cached
+    
+    headers, data = build_request(text, system_prompt, config)
+    
+    for attempt in range(config.retry_count):
+        try:
+            async with session.post(config.base_url, data=_dumps(data), headers=headers) as response:
+                body = await response.read()
+                if response.status != 200:
+                    print(f"HTTP Error {response.status} (attempt {attempt + 1}): {body.decode('utf-8', 'replace')}")
+                    
+                    # 429 或 5xx 错误时重试
+                    if response.status in (429, 500, 502, 503, 504):
+                        await asyncio.sleep(config.retry_delay * (attempt + 1))
+                        continue
+                    return None
+                
+                result = _loads(body)
+                content = result['choices'][0]['message']['content']
+                parsed, error = _parse_output(content, schema)
+                if error is None:
+                    if key is not None:
+                        cache.put(key, parsed, {"model": config.model, "promptVersion": PROMPT_VERSION})
+                    return parsed
+                
+                # 输出无法解析或与 schema 不符：把错误反馈给模型后重试，而不是原样重发
+                print(f"Invalid output (attempt {attempt + 1}): {error}")
+                if attempt < config.retry_count - 1:
+                    _add_feedback(data["messages"], content, error)
+                    await asyncio.sleep(config.retry_delay * (attempt + 1))
+                    continue
+                return None
+                
+        except json.JSONDecodeError as e:
+            print(f"JSON decode error (attempt {attempt + 1}): {e}")
+            if attempt < config.retry_count - 1:
+                await asyncio.sleep(config.retry_delay)
+                continue
+            return None
+            
+        except Exception as e:
+            print(f"Error calling API (attempt {attempt + 1}): {e}")
+            if attempt < config.retry_count - 1:
+                await asyncio.sleep(config.retry_delay)
+                continue
+            return None
+    
+    return None
+
+
+def _prepare_batch(batch: List[Tuple], config: LLMConfig) -> Tuple[str, str]:
+    """返回一组任务的请求文本和日志标签"""
+    basename, text = batch[0][1], batch[0][2]
+    label = basename
+    if config.batch_size > 1:
+        text = join_batch_texts([task[2] for task in batch])
+        if len(batch) > 1:
+            label = f"{len(batch)} chunks ({basename} ~ {batch[-1][1]})"
+    return text, label
+
+
+def _save_batch_outputs(
+    batch: List[Tuple],
+    result: Optional[Dict],
+    config: LLMConfig,
+    pretty: bool
+) -> Tuple[int, int]:
+    """将一组任务的结果写入各自的输出文件，返回 (success, failed)"""
+    success = 0
+    failed = 0
+    outputs = split_batch_result(result, len(batch)) if config.batch_size > 1 else [result]
+    for task, output in zip(batch, outputs):
+        chunk_name, output_path = task[1], task[5]
+        if output:
+            final_output = {
+                "chunkFile": chunk_name,
+                "output": output
+            }
+            
+            # 原子写入：断点续传时 skip_existing 不会跳过写了一半的文件
+            _write_atomic(output_path, _dumps(final_output, indent=pretty))
+            print(f"  -> Saved to {os.path.basename(output_path)}")
+            success += 1
+        else:
+            print(f"  -> Failed to get valid result for {chunk_name}")
+            failed += 1
+    return success, failed
+
+
+async def _run_tasks(
+    batches: Iterable[List[Tuple]],
+    total: int,
+    config: LLMConfig,
+    concurrency: int,
+    rate_limit_delay: float,
+    cache: Optional[ExtractionCache] = None,
+    pretty: bool = False
+) -> Tuple[int, int]:
+    """
+    并发执行抽取任务，返回 (success, failed)
+    
+    batches 为任务分组（每组发一次请求），可以是惰性迭代器：
+    同时在途的请求数有上限，不会一次性展开全部任务。
+    """
+    import aiohttp
+    
+    sem = asyncio.Semaphore(max(1, concurrency))
+    limiter = IntervalLimiter(rate_limit_delay)
+    timeout = aiohttp.ClientTimeout(total=config.timeout)
+    connector = aiohttp.TCPConnector(limit=config.pool_maxsize)
+    success = 0
+    failed = 0
+    
+    # 所有请求共享一个会话，复用 TCP/TLS 连接
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        async def worker(batch: List[Tuple]) -> None:
+            nonlocal success, failed
+            index, _, _, schema, system_prompt, _ = batch[0]
+            text, label = _prepare_batch(batch, config)
+            
+            # 缓存命中时不占用并发名额，也不经过限速
+            result = None
+            key = None
+            if cache is not None:
+                key = cache.make_key(config, system_prompt, text)
+                result = cache.get(key, schema)
+                if result is not None:
+                    print(f"[{index + 1}/{total}] Cache hit {label}")
+            
+            if result is None:
+                async with sem:
+                    await limiter.wait()
+                    print(f"[{index + 1}/{total}] Processing {label}...")
+                    try:
+                        result = await call_llm_async(
+                            session, text, None, schema, config, cache, system_prompt, key
+                        )
+                    except Exception as e:
+                        print(f"Error processing line {index + 1}: {e}")
+                        failed += len(batch)
+                        return
+            
+            ok, bad = _save_batch_outputs(batch, result, config, pretty)
+            success += ok
+            failed += bad
+        
+        await run_bounded((worker(batch) for batch in batches), max(1, concurrency) * 2)
+    
+    return success, failed
+
+
+def _run_tasks_threaded(
+    batches: Iterable[List[Tuple]],
+    total: int,
+    config: LLMConfig,
+    concurrency: int,
+    rate_limit_delay: float,
+    cache: Optional[ExtractionCache] = None,
+    pretty: bool = False
+) -> Tuple[int, int]:
+    """
+    未安装 aiohttp 时的线程池版本：每个线程调用同步的 call_llm，
+    socket I/O 期间释放 GIL，网络密集型请求可以随线程数线性并发
+    """
+    limiter = IntervalLimiter(rate_limit_delay)
+    
+    def worker(batch: List[Tuple]) -> Tuple[int, int]:
+        index, _, _, schema, system_prompt, _ = batch[0]
+        text, label = _prepare_batch(batch, config)
+        
+        result = None
+        key = None
+        if cache is not None:
+            key = cache.make_key(config, system_prompt, text)
+            result = cache.get(key, schema)
+            if result is not None:
+                print(f"[{index + 1}/{total}] Cache hit {label}")
+        
+        if result is None:
+            limiter.wait_blocking()
+            print(f"[{index + 1}/{total}] Processing {label}...")
+            try:
+                result = call_llm(text, None, schema, config, cache, system_prompt, key)
+            except Exception as e:
+                print(f"Error processing line {index + 1}: {e}")
+                return 0, len(batch)
+        
+        return _save_batch_outputs(batch, result, config, pretty)
+    
+    success = 0
+    failed = 0
+    workers = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending = set()
+        
+        def collect(done) -> None:
+            nonlocal success, failed
+            for future in done:
+                ok, bad = future.result()
+                success += ok
+                failed += bad
+        
+        for batch in batches:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(ex.submit(worker, batch))
+        collect(wait(pending).done)
+    
+    return success, failed
+
+
 def run_extraction(
     prompts_file: str,
     output_dir: str,
     config: LLMConfig,
     rate_limit_delay: float = 1.0,
-    skip_existing: bool = True
+    skip_existing: bool = True,
+    concurrency: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    pretty: bool = False
 ) -> Dict:
     """
     批量执行 LLM 抽取
     
+    请求通过 aiohttp 并发发送（未安装 aiohttp 时改用线程池）：最多 concurrency
+    个请求同时进行，相邻请求的发出间隔不小于 rate_limit_delay。config.batch_size > 1 时每次请求
+    打包多个分片，结果按 chunkIndex 拆回各分片的输出文件。
+    
     Args:
         prompts_file: JSONL 格式的提示词文件
         output_dir: 输出目录
         config: LLM 配置
         rate_limit_delay: 请求间隔（秒）
         skip_existing: 是否跳过已存在的输出
+        concurrency: 最大并发请求数（默认使用 config.concurrency）
+        cache_dir: 抽取缓存目录（为 None 时不使用缓存）
+        pretty: 输出文件是否缩进（默认紧凑 JSON，供下游程序读取）
     
     Returns:
         处理结果统计
@@ -158,67 +684,107 @@ def run_extraction(
     
     os.makedirs(output_dir, exist_ok=True)
     
-    # 读取提示词
-    with open(prompts_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    # 先快速数一遍行数用于进度显示，再流式读取，不把整个提示词文件读入内存
+    with open(prompts_file, 'rb') as f:
+        total = sum(1 for line in f if line.strip())
     
-    total = len(lines)
     success = 0
     skipped = 0
     failed = 0
     
-    print(f"Found {total} chunks to process.")
-    
-    for i, line in enumerate(lines):
+    with open(prompts_file, 'rb') as f:
+        # 新格式（format_version 2）首行为公共 header（instructions、schema），
+        # 其余每行只含 chunkFile 和 text；旧格式每行自带完整 input
+        first_line = f.readline()
+        header = None
         try:
-            item = json.loads(line)
-            chunk_file = item['chunkFile']
-            input_data = item['input']
-            
-            # 构建输出文件名
-            basename = os.path.basename(chunk_file)
-            output_filename = f"output_{basename.replace('.txt', '.json')}"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            # 跳过已存在的文件
-            if skip_existing and os.path.exists(output_path):
-                print(f"[{i+1}/{total}] Skipping {basename}, already exists.")
-                skipped += 1
-                continue
-            
-            print(f"[{i+1}/{total}] Processing {basename}...")
-            
-            # 调用 LLM
-            result = call_llm(
-                input_data['text'], 
-                input_data['instructions'], 
-                input_data['schema'],
-                config
-            )
-            
-            if result:
-                final_output = {
-                    "chunkFile": basename,
-                    "output": result
-                }
-                
-                with open(output_path, 'w', encoding='utf-8') as out:
-                    json.dump(final_output, out, ensure_ascii=False, indent=2)
-                print(f"  -> Saved to {output_filename}")
-                success += 1
-            else:
-                print("  -> Failed to get valid result")
-                failed += 1
-            
-            # 速率限制
-            time.sleep(rate_limit_delay)
-            
+            first = _loads(first_line)
         except json.JSONDecodeError:
-            print(f"Skipping line {i+1}: Invalid JSON in prompts file")
-            failed += 1
-        except Exception as e:
-            print(f"Error processing line {i+1}: {e}")
-            failed += 1
+            first = None
+        if isinstance(first, dict) and "header" in first:
+            header = first["header"]
+            lines = f
+            total -= 1
+        elif first_line:
+            lines = itertools.chain([first_line], f)
+        else:
+            lines = f
+        first_line_no = 2 if header is not None else 1
+        
+        print(f"Found {total} chunks to process.")
+        
+        def iter_tasks():
+            """逐行解析提示词，产出待处理任务"""
+            nonlocal skipped, failed
+            # 系统提示词只在指令或 schema 变化时重新构建（通常整个文件只构建一次）
+            last_key = None
+            system_prompt = None
+            call_schema = None
+            for i, line in enumerate(lines):
+                if not line.strip():
+                    continue
+                try:
+                    item = _loads(line)
+                    chunk_file = item['chunkFile']
+                    
+                    # 构建输出文件名
+                    basename = os.path.basename(chunk_file)
+                    output_filename = f"output_{basename.replace('.txt', '.json')}"
+                    output_path = os.path.join(output_dir, output_filename)
+                    
+                    # 跳过已存在的文件
+                    if skip_existing and os.path.exists(output_path):
+                        print(f"[{i+1}/{total}] Skipping {basename}, already exists.")
+                        skipped += 1
+                        continue
+                    
+                    if header is not None and 'input' not in item:
+                        instructions = header['instructions']
+                        schema = header['schema']
+                        text = item['text']
+                    else:
+                        input_data = item['input']
+                        instructions = input_data['instructions']
+                        schema = input_data['schema']
+                        text = input_data['text']
+                    
+                    if last_key is None or last_key[0] != instructions or last_key[1] is not schema and last_key[1] != schema:
+                        if config.batch_size > 1:
+                            call_schema = build_batch_schema(schema)
+                            system_prompt = build_system_prompt(instructions + BATCH_INSTRUCTIONS, call_schema)
+                        else:
+                            call_schema = schema
+                            system_prompt = build_system_prompt(instructions, schema)
+                        last_key = (instructions, schema)
+                        # 输出摘要便于确认整批任务使用的是同一份系统提示词
+                        digest = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+                        print(f"System prompt sha256: {digest[:16]} ({len(system_prompt)} chars)")
+                    
+                    yield i, basename, text, call_schema, system_prompt, output_path
+                    
+                except json.JSONDecodeError:
+                    print(f"Skipping line {i + first_line_no}: Invalid JSON in prompts file")
+                    failed += 1
+                except Exception as e:
+                    print(f"Error processing line {i + first_line_no}: {e}")
+                    failed += 1
+        
+        cache = ExtractionCache(cache_dir) if cache_dir else None
+        if concurrency is None:
+            concurrency = config.concurrency
+        batches = _group_tasks(iter_tasks(), max(1, config.batch_size))
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            ok, bad = _run_tasks_threaded(
+                batches, total, config, concurrency, rate_limit_delay, cache, pretty
+            )
+        else:
+            ok, bad = asyncio.run(
+                _run_tasks(batches, total, config, concurrency, rate_limit_delay, cache, pretty)
+            )
+        success += ok
+        failed += bad
     
     return {
         "total": total,
@@ -239,12 +805,16 @@ def load_extraction_results(output_dir: str) -> List[Dict]:
     Returns:
         结果列表
     """
-    results = []
+    # scandir 直接给出文件名和路径，只对匹配的条目排序
+    entries = [
+        e for e in os.scandir(output_dir)
+        if e.name.startswith("output_") and e.name.endswith(".json")
+    ]
+    entries.sort(key=lambda e: e.name)
     
-    for filename in sorted(os.listdir(output_dir)):
-        if filename.startswith("output_") and filename.endswith(".json"):
-            filepath = os.path.join(output_dir, filename)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                results.append(json.load(f))
+    results = []
+    for entry in entries:
+        with open(entry.path, 'rb') as f:
+            results.append(_loads(f.read()))
     
     return results
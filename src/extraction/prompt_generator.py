@@ -9,15 +9,14 @@ LLM 提示词生成器 - 为文本分片生成结构化的 LLM 提示词
  - 支持自定义抽取指令和 schema
  - 支持多种抽取场景（小说地点、人物生平等）
 
-输出 JSONL 格式：
-{
-  "chunkFile": "...",
-  "input": {
-    "instructions": "...",
-    "schema": { ... },
-    "text": "<chunk content>"
-  }
-}
+输出 JSONL 格式（format_version 2）：
+首行为公共 header，所有分片共用同一份指令和 schema：
+{"format_version": 2, "header": {"instructions": "...", "schema": { ... }}}
+其余每行一个分片：
+{"chunkFile": "...", "text": "<chunk content>"}
+
+旧格式（每行自带完整 input）仍可由 load_prompts 读取：
+{"chunkFile": "...", "input": {"instructions": "...", "schema": { ... }, "text": "..."}}
 """
 
 from __future__ import annotations
@@ -28,6 +27,10 @@ import glob
 from typing import Dict, List, Optional, Callable
 
 
+# 提示词文件格式版本
+PROMPTS_FORMAT_VERSION = 2
+
+
 def default_place_extraction_instructions() -> str:
     """默认的地点抽取指令"""
     return (
@@ -175,19 +178,18 @@ def generate_prompts(
     os.makedirs(os.path.dirname(output_jsonl) or ".", exist_ok=True)
     
     with open(output_jsonl, "w", encoding="utf-8") as out:
+        # 指令和 schema 只在首行写一次
+        header = {
+            "format_version": PROMPTS_FORMAT_VERSION,
+            "header": {"instructions": instructions, "schema": schema},
+        }
+        out.write(json.dumps(header, ensure_ascii=False) + "\n")
+        
         for fn in files:
             with open(fn, "r", encoding="utf-8") as f:
                 text = f.read()
             
-            obj = {
-                "chunkFile": fn,
-                "input": {
-                    "instructions": instructions,
-                    "schema": schema,
-                    "text": text,
-                },
-            }
-            out.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            out.write(json.dumps({"chunkFile": fn, "text": text}, ensure_ascii=False) + "\n")
     
     return {
         "chunks_dir": chunks_dir,
@@ -201,6 +203,9 @@ def load_prompts(jsonl_path: str) -> List[Dict]:
     """
     加载 JSONL 格式的提示词
     
+    新旧两种格式都返回旧格式的条目（{"chunkFile", "input": {...}}），
+    新格式中各条目的 instructions/schema 引用同一份 header 数据。
+    
     Args:
         jsonl_path: JSONL 文件路径
     
@@ -208,9 +213,24 @@ def load_prompts(jsonl_path: str) -> List[Dict]:
         提示词列表
     """
     prompts = []
+    header = None
     with open(jsonl_path, "r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
-            if line:
-                prompts.append(json.loads(line))
+            if not line:
+                continue
+            obj = json.loads(line)
+            if "header" in obj:
+                header = obj["header"]
+                continue
+            if header is not None and "input" not in obj:
+                obj = {
+                    "chunkFile": obj["chunkFile"],
+                    "input": {
+                        "instructions": header["instructions"],
+                        "schema": header["schema"],
+                        "text": obj["text"],
+                    },
+                }
+            prompts.append(obj)
     return prompts
@@ -19,16 +19,13 @@ from __future__ import annotations
 import json
 import os
 import re
-from typing import List, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 
-# 章节标题正则表达式
-CHAPTER_PATTERNS = [
-    re.compile(r"第[一二三四五六七八九十〇零百千0-9]+章[ \t\u3000]*[\S ]*"),  # 第X章
-    re.compile(r"第[一二三四五六七八九十〇零百千0-9]+回[ \t\u3000]*[\S ]*"),  # 第X回
-    re.compile(r"第[一二三四五六七八九十〇零百千0-9]+节[ \t\u3000]*[\S ]*"),  # 第X节
-    re.compile(r"第[一二三四五六七八九十〇零百千0-9]+卷[ \t\u3000]*[\S ]*"),  # 第X卷
-]
+# 章节标题正则表达式（第X章、第X回、第X节、第X卷 合并为一个字符类，单次扫描全文）
+CHAPTER_PATTERN = re.compile(r"第[一二三四五六七八九十〇零百千0-9]+[章回节卷][ \t\u3000]*[\S ]*")
 
 
 def read_text(path: str) -> str:
@@ -37,41 +34,105 @@ def read_text(path: str) -> str:
         return f.read()
 
 
+# 并行写分片文件的线程数
+WRITE_WORKERS = 16
+
+# 连续 3 个及以上换行符
+_MULTI_NEWLINE_RE = re.compile(r"\n{3,}")
+
+
+def _is_cjk(ch: str) -> bool:
+    return "\u4e00" <= ch <= "\u9fff"
+
+
+def _remove_cjk_pipes(text: str) -> str:
+    """移除两侧都是中文字符的垂直线（单次线性扫描，只在 | 处做判断）"""
+    parts = text.split("|")
+    out = [parts[0]]
+    for i in range(1, len(parts)):
+        prev = parts[i - 1]
+        cur = parts[i]
+        if prev and cur and _is_cjk(prev[-1]) and _is_cjk(cur[0]):
+            out.append(cur)
+        else:
+            out.append("|")
+            out.append(cur)
+    return "".join(out)
+
+
 def normalize(text: str) -> str:
     """
     文本规范化处理
     - 移除中文字符间的垂直线（如 北|京）
     - 压缩连续换行符
+    
+    文本中没有 | 或连续 3 个换行时直接跳过对应步骤。
     """
     # 移除中文字符间的垂直线
-    text = re.sub(r"(?<=[\u4e00-\u9fff])\|(?=[\u4e00-\u9fff])", "", text)
+    if "|" in text:
+        text = _remove_cjk_pipes(text)
     # 压缩 3+ 换行符为 2 个
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    if "\n\n\n" in text:
+        text = _MULTI_NEWLINE_RE.sub("\n\n", text)
     return text
 
 
+@lru_cache(maxsize=32)
+def _combine_patterns(patterns: Tuple[re.Pattern, ...]) -> re.Pattern:
+    """将多个章节正则合并为一个交替式（相同的正则组合只编译一次）"""
+    return re.compile("|".join(f"(?:{p.pattern})" for p in patterns))
+
+
 def find_chapters(text: str, patterns: List[re.Pattern] = None) -> List[Tuple[int, str]]:
     """
     查找所有章节标题
     
     Args:
         text: 输入文本
-        patterns: 章节标题正则列表，默认使用 CHAPTER_PATTERNS
+        patterns: 章节标题正则列表，默认使用 CHAPTER_PATTERN；多个正则会合并为一个交替式
     
     Returns:
         [(position, title), ...] 章节位置和标题列表
     """
-    if patterns is None:
-        patterns = CHAPTER_PATTERNS
+    if not patterns:
+        pattern = CHAPTER_PATTERN
+    elif len(patterns) == 1:
+        pattern = patterns[0]
+    else:
+        pattern = _combine_patterns(tuple(patterns))
     
-    chapters: List[Tuple[int, str]] = []
-    for pattern in patterns:
-        for m in pattern.finditer(text):
-            chapters.append((m.start(), m.group().strip()))
+    # 单次扫描的匹配位置严格递增，无需再排序去重
+    return [(m.start(), m.group().strip()) for m in pattern.finditer(text)]
+
+
+def iter_chunks(text: str, chapters: Iterable[Tuple[int, str]], per_chunk: int = 2) -> Iterator[Dict]:
+    """
+    逐个产出分片（章节可以是惰性迭代器，只向前看一个章节）
     
-    # 按位置排序并去重
-    chapters = sorted(set(chapters), key=lambda x: x[0])
-    return chapters
+    Args:
+        text: 输入文本
+        chapters: 章节 [(position, title), ...]，按位置递增
+        per_chunk: 每个分片包含的章节数
+    
+    Yields:
+        分片信息 {start, end, chapters}（只记录偏移，不复制分片文本，
+        写入时由 write_chunks 按偏移从原文切片）
+    """
+    it = iter(chapters)
+    first = next(it, None)
+    if first is None:
+        # 无章节时将整个文本作为一个块
+        yield {"start": 0, "end": len(text), "chapters": ["全文"]}
+        return
+    
+    # 每组的结束位置即下一组第一个章节的起始位置
+    group = [first]
+    for chapter in it:
+        if len(group) >= per_chunk:
+            yield {"start": group[0][0], "end": chapter[0], "chapters": [name for _, name in group]}
+            group = []
+        group.append(chapter)
+    yield {"start": group[0][0], "end": len(text), "chapters": [name for _, name in group]}
 
 
 def slice_chunks(text: str, chapters: List[Tuple[int, str]], per_chunk: int = 2) -> List[Dict]:
@@ -86,41 +147,32 @@ def slice_chunks(text: str, chapters: List[Tuple[int, str]], per_chunk: int = 2)
     Returns:
         分片列表，每个元素包含 start, end, chapters, text
     """
-    if not chapters:
-        # 无章节时将整个文本作为一个块
-        return [{"start": 0, "end": len(text), "chapters": ["全文"], "text": text}]
-
-    # 构建章节范围
-    ranges: List[Dict] = []
-    for idx, (start, name) in enumerate(chapters):
-        end = chapters[idx + 1][0] if idx + 1 < len(chapters) else len(text)
-        ranges.append({"name": name, "start": start, "end": end})
-
-    # 按 per_chunk 分组
-    chunks: List[Dict] = []
-    for i in range(0, len(ranges), per_chunk):
-        group = ranges[i : i + per_chunk]
-        start = group[0]["start"]
-        end = group[-1]["end"]
-        chunk_text = text[start:end]
-        chunk_meta = {
-            "start": start, 
-            "end": end, 
-            "chapters": [r["name"] for r in group], 
-            "text": chunk_text
-        }
-        chunks.append(chunk_meta)
-    
+    chunks = list(iter_chunks(text, chapters, per_chunk))
+    for ch in chunks:
+        ch["text"] = text[ch["start"]:ch["end"]]
     return chunks
 
 
-def write_chunks(out_dir: str, chunks: List[Dict]) -> Dict:
+def _write_chunk(path: str, text: str, start: int, end: int) -> None:
+    """写入单个分片文件（在写入线程中切片，避免同时持有所有分片副本）"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text[start:end])
+
+
+def write_chunks(out_dir: str, chunks: Iterable[Dict], text: Optional[str] = None,
+                 max_workers: int = WRITE_WORKERS) -> Dict:
     """
     将分片写入文件
     
+    分片文件由线程池并行写入（瓶颈在文件系统调用而非 CPU），
+    index.json 在全部分片写完后最后写入。
+    
     Args:
         out_dir: 输出目录
-        chunks: 分片列表
+        chunks: 分片列表或 iter_chunks 产出的迭代器
+        text: 原文；为 None 时使用各分片自带的 text 字段（slice_chunks 输出），
+            iter_chunks 只记录偏移，必须同时传入原文
+        max_workers: 写文件的线程数
     
     Returns:
         索引信息
@@ -128,23 +180,34 @@ def write_chunks(out_dir: str, chunks: List[Dict]) -> Dict:
     os.makedirs(out_dir, exist_ok=True)
     index = []
     
+    jobs = []
+    
     for i, ch in enumerate(chunks, start=1):
         fn = os.path.join(out_dir, f"chunk_{i:03d}.txt")
-        with open(fn, "w", encoding="utf-8") as f:
-            f.write(ch["text"])
+        if text is None:
+            if "text" not in ch:
+                raise ValueError("分片只包含偏移（iter_chunks 输出），write_chunks 需要传入原文 text")
+            source, start, end = ch["text"], 0, len(ch["text"])
+        else:
+            source, start, end = text, ch["start"], ch["end"]
+        jobs.append((fn, source, start, end))
         index.append({
             "file": fn, 
             "chapters": ch["chapters"], 
             "start": ch["start"], 
             "end": ch["end"], 
-            "length": len(ch["text"])
+            "length": end - start
         })
     
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        # list() 确保所有写入完成并抛出其中的异常
+        list(ex.map(lambda job: _write_chunk(*job), jobs))
+    
     index_path = os.path.join(out_dir, "index.json")
     with open(index_path, "w", encoding="utf-8") as f:
         json.dump(index, f, ensure_ascii=False, indent=2)
     
-    return {"total_chunks": len(chunks), "index_path": index_path}
+    return {"total_chunks": len(index), "index_path": index_path}
 
 
 def split_text(text_path: str, out_dir: str, per_chunk: int = 2, 
@@ -164,8 +227,7 @@ def split_text(text_path: str, out_dir: str, per_chunk: int = 2,
     text = read_text(text_path)
     text = normalize(text)
     chapters = find_chapters(text, custom_patterns)
-    chunks = slice_chunks(text, chapters, per_chunk)
-    result = write_chunks(out_dir, chunks)
+    result = write_chunks(out_dir, iter_chunks(text, chapters, per_chunk), text)
     
     return {
         "input_file": text_path,
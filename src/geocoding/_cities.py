@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+中国主要城市中心点坐标与球面距离（amap.py 与 validator.py 的距离验证共用）
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Tuple
+
+try:
+    from numba import njit
+except ImportError:  # numba 为可选依赖，未安装时使用纯 Python 实现
+    njit = None
+
+_CITIES: List[Tuple[str, float, float]] = [
+    ("北京市", 39.9042, 116.4074),
+    ("上海市", 31.2304, 121.4737),
+    ("广州市", 23.1291, 113.2644),
+    ("深圳市", 22.5431, 114.0579),
+    ("杭州市", 30.2741, 120.1551),
+    ("南京市", 32.0603, 118.7969),
+    ("成都市", 30.5728, 104.0668),
+    ("重庆市", 29.5630, 106.5516),
+    ("武汉市", 30.5928, 114.3055),
+    ("西安市", 34.3416, 108.9398),
+    ("苏州市", 31.2989, 120.5853),
+    ("天津市", 39.1244, 117.1944),
+    ("南平市", 26.6417, 118.1780),
+    ("福州市", 26.0745, 119.2965),
+    ("长沙市", 28.2282, 112.9388),
+    ("郑州市", 34.7466, 113.6254),
+    ("济南市", 36.6512, 117.1209),
+    ("青岛市", 36.0671, 120.3826),
+    ("沈阳市", 41.8057, 123.4315),
+    ("大连市", 38.9140, 121.6147),
+    ("哈尔滨市", 45.8038, 126.5340),
+    ("长春市", 43.8868, 125.3245),
+    ("昆明市", 25.0406, 102.7129),
+    ("贵阳市", 26.6470, 106.6302),
+    ("南昌市", 28.6829, 115.8579),
+    ("合肥市", 31.8206, 117.2272),
+    ("石家庄市", 38.0428, 114.5149),
+    ("太原市", 37.8706, 112.5489),
+    ("兰州市", 36.0611, 103.8343),
+    ("乌鲁木齐市", 43.8256, 87.6168),
+    ("拉萨市", 29.6470, 91.1145),
+    ("西宁市", 36.6171, 101.7782),
+    ("银川市", 38.4681, 106.2731),
+    ("呼和浩特市", 40.8416, 111.7519),
+    ("南宁市", 22.8170, 108.3665),
+    ("海口市", 20.0444, 110.1999),
+    ("温州市", 28.0016, 120.6722),
+    ("宁波市", 29.8683, 121.5440),
+    ("无锡市", 31.4912, 120.3119),
+    ("厦门市", 24.4798, 118.0894),
+]
+
+CITY_CENTERS: Dict[str, Tuple[float, float]] = {
+    name: (lat, lon) for name, lat, lon in _CITIES
+}
+
+# 城市中心纬度余弦（平面近似用），导入时计算一次
+CITY_CENTERS_COS: Dict[str, float] = {
+    name: math.cos(math.radians(lat)) for name, lat, _ in _CITIES
+}
+
+
+# 模块级绑定，省去热路径上的 math 属性查找
+_sin = math.sin
+_cos = math.cos
+_asin = math.asin
+_sqrt = math.sqrt
+_rad = math.radians
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float, _R: float = 6371.0) -> float:
+    """
+    计算两点间的球面距离（单位：公里）
+    
+    Args:
+        lat1, lon1: 第一个点的纬度和经度
+        lat2, lon2: 第二个点的纬度和经度
+    
+    Returns:
+        距离（公里）
+    """
+    dp = _rad(lat2 - lat1) * 0.5
+    dl = _sin(_rad(lon2 - lon1) * 0.5)
+    a = _sin(dp)
+    a = a * a + _cos(_rad(lat1)) * _cos(_rad(lat2)) * dl * dl
+    return 2 * _R * _asin(_sqrt(a))
+
+
+# 近似距离落在阈值 ±5% 内时改用 haversine 复核
+BORDERLINE_RATIO = 0.05
+
+_DEG_TO_RAD = math.pi / 180
+
+
+def fast_distance_km(
+    city_lat: float, city_lon: float, cos_city_lat: float,
+    result_lat: float, result_lon: float, _R: float = 6371.0,
+) -> float:
+    """等距圆柱（平面）近似距离（公里），无三角函数调用；仅适用于城市级短距离"""
+    dy = (result_lat - city_lat) * _DEG_TO_RAD
+    dx = cos_city_lat * (result_lon - city_lon) * _DEG_TO_RAD
+    return _R * _sqrt(dy * dy + dx * dx)
+
+
+def city_distance_km(city: str, lat: float, lon: float, max_dist: float) -> float:
+    """
+    城市中心到 (lat, lon) 的距离（公里），用于与阈值 max_dist 比较
+
+    先用平面近似，结果接近阈值（±5%）时再用 haversine 精确计算；city 须在 CITY_CENTERS 中。
+    """
+    city_lat, city_lon = CITY_CENTERS[city]
+    distance = fast_distance_km(city_lat, city_lon, CITY_CENTERS_COS[city], lat, lon)
+    if abs(distance - max_dist) <= max_dist * BORDERLINE_RATIO:
+        distance = haversine_distance(city_lat, city_lon, lat, lon)
+    return distance
+
+
+if njit is not None:
+    # 重新验证大量缓存结果时逐点调用次数很多，编译为机器码省去解释开销
+    haversine_distance = njit(cache=True, fastmath=True)(haversine_distance)
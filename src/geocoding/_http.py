@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+地理编码 HTTP 工具（amap.py 与 nominatim.py 共用）
+
+urllib3 为可选依赖；未安装时 get_pool 返回 None，调用方回退到 urllib（每次请求新建连接）。
+"""
+
+from __future__ import annotations
+
+import http.client
+import threading
+import urllib.error
+from typing import Any, Dict, Optional
+
+try:
+    import urllib3
+except ImportError:  # urllib3 未安装时回退到 urllib（每次请求新建连接）
+    urllib3 = None
+
+# 网络/传输层错误（超时、连接失败、HTTP 错误状态等）：属于暂时性失败，调用方不应当作“未找到”缓存
+TRANSPORT_ERRORS = (OSError, http.client.HTTPException)
+if urllib3 is not None:
+    TRANSPORT_ERRORS += (urllib3.exceptions.HTTPError,)
+
+# 模块级连接池（按 User-Agent 区分）：连续查询复用 HTTPS 长连接
+_POOLS: Dict[str, Any] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(user_agent: str, maxsize: int = 32) -> Optional[Any]:
+    """获取（首次调用时创建）共享连接池；maxsize 以首次创建时为准，未安装 urllib3 时返回 None"""
+    if urllib3 is None:
+        return None
+    pool = _POOLS.get(user_agent)
+    if pool is None:
+        # 多个工作线程可能同时首次调用
+        with _POOLS_LOCK:
+            pool = _POOLS.get(user_agent)
+            if pool is None:
+                # block=False：并发超过 maxsize 时临时新建连接而不是排队等待，
+                # 归还时只保留 maxsize 条空闲长连接。
+                # 只重试连接失败；429/503 等状态码原样返回，由调用方按 Retry-After 处理限流
+                pool = urllib3.PoolManager(
+                    num_pools=2,
+                    maxsize=maxsize,
+                    block=False,
+                    retries=urllib3.Retry(
+                        total=3, connect=3, read=0, backoff_factor=0.3,
+                        status_forcelist=(), respect_retry_after_header=False,
+                        raise_on_status=False,
+                    ),
+                    headers={"User-Agent": user_agent, "Connection": "keep-alive"},
+                )
+                _POOLS[user_agent] = pool
+    return pool
+
+
+def raise_for_status(url: str, resp: Any) -> None:
+    """urllib3 响应状态码为 4xx/5xx 时抛出 urllib.error.HTTPError（与 urlopen 行为一致）"""
+    if resp.status >= 400:
+        raise urllib.error.HTTPError(url, resp.status, resp.reason or "", resp.headers, None)
@@ -20,54 +20,38 @@
 
 from __future__ import annotations
 
-import json
-import math
 import os
+import re
+import sqlite3
+import sys
 import time
 import threading
+import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Any, Dict, List, Optional, Tuple
-
-
-# ==================== 城市中心坐标（用于距离验证）====================
-
-CITY_CENTERS = {
-    "北京市": (39.9042, 116.4074),
-    "上海市": (31.2304, 121.4737),
-    "天津市": (39.1244, 117.1944),
-    "重庆市": (29.5630, 106.5516),
-    "杭州市": (30.2741, 120.1551),
-    "南京市": (32.0603, 118.7969),
-    "苏州市": (31.2989, 120.5853),
-    "武汉市": (30.5928, 114.3055),
-    "成都市": (30.5728, 104.0668),
-    "西安市": (34.3416, 108.9398),
-    "南平市": (26.6417, 118.1780),
-    "福州市": (26.0745, 119.2965),
-    "厦门市": (24.4798, 118.0894),
-    "广州市": (23.1291, 113.2644),
-    "深圳市": (22.5431, 114.0579),
-    "长沙市": (28.2282, 112.9388),
-    "郑州市": (34.7466, 113.6254),
-    "济南市": (36.6512, 117.1209),
-    "青岛市": (36.0671, 120.3826),
-    "沈阳市": (41.8057, 123.4315),
-    "大连市": (38.9140, 121.6147),
-    "哈尔滨市": (45.8038, 126.5340),
-    "长春市": (43.8868, 125.3245),
-    "昆明市": (25.0406, 102.7129),
-    "贵阳市": (26.6470, 106.6302),
-    "兰州市": (36.0611, 103.8343),
-    "银川市": (38.4681, 106.2731),
-    "乌鲁木齐市": (43.8256, 87.6168),
-    "拉萨市": (29.6470, 91.1145),
-    "呼和浩特市": (40.8416, 111.7519),
-    "南昌市": (28.6829, 115.8579),
-    "合肥市": (31.8206, 117.2272),
-    "太原市": (37.8706, 112.5489),
-    "石家庄市": (38.0428, 114.5149),
-}
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from collections.abc import MutableMapping
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from ..common.jsonio import dumps as _dumps, loads as _loads
+except ImportError:  # 以脚本方式运行或以 src 为导入根时没有上级包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.jsonio import dumps as _dumps, loads as _loads
+
+try:
+    from ._cities import CITY_CENTERS, city_distance_km
+except ImportError:  # 作为脚本直接运行时没有包上下文
+    from _cities import CITY_CENTERS, city_distance_km
+
+try:
+    from ._http import TRANSPORT_ERRORS, get_pool, raise_for_status
+except ImportError:  # 作为脚本直接运行时没有包上下文
+    from _http import TRANSPORT_ERRORS, get_pool, raise_for_status
+
+
+# ==================== 距离验证参数（城市中心坐标见 _cities.py）====================
 
 # 距离阈值（公里）
 MAX_DISTANCE = {
@@ -80,65 +64,212 @@ MAX_DISTANCE = {
 
 # ==================== 工具函数 ====================
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """计算两点间的球面距离（公里）"""
-    R = 6371
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
+def split_address_levels(address: str) -> Tuple[str, ...]:
+    """分割地址层级（字符串结果缓存；层级字符串驻留，同名省市共享同一对象）"""
+    if isinstance(address, str):
+        return _split_address_levels(address)
+    # LLM 输出中 address 可能是列表等不可哈希类型，不走缓存
+    return _split_address_levels.__wrapped__(address)
 
 
-def split_address_levels(address: str) -> List[str]:
-    """分割地址层级"""
+@lru_cache(maxsize=8192)
+def _split_address_levels(address: str) -> Tuple[str, ...]:
     parts = [p.strip() for p in str(address).split("-")]
-    return [p for p in parts if p]
+    return tuple(sys.intern(p) for p in parts if p)
+
+
+def level_parts(query_levels: Sequence[str]) -> Tuple[str, str, str, int, str]:
+    """取出 (省, 市, 区, 层级数, 去后缀城市名)，供验证函数复用"""
+    n = len(query_levels)
+    city = query_levels[1] if n >= 2 else ""
+    return (
+        query_levels[0] if n >= 1 else "",
+        city,
+        query_levels[2] if n >= 3 else "",
+        n,
+        _canon_city(city),
+    )
+
+
+# 城市名中需要去掉的行政区划字样（一次扫描完成替换）
+_CITY_SUFFIX_RE = re.compile(r"市|地区|自治州")
+
+
+@lru_cache(maxsize=4096)
+def _canon_city(city: str) -> str:
+    """城市名去掉 市/地区/自治州 字样（规范形式，每个城市只计算一次）"""
+    return _CITY_SUFFIX_RE.sub("", city)
 
 
 # ==================== 速率限制器 ====================
 
 class RateLimiter:
-    """令牌桶速率限制器"""
+    """令牌桶速率限制器（等待令牌时阻塞在条件变量上，不轮询）"""
     
     def __init__(self, rate_per_sec: float = 30.0):
         self.rate = max(0.1, float(rate_per_sec))
+        self.base_rate = self.rate
+        self._restore_timer: Optional[threading.Timer] = None
         self.capacity = max(1, int(self.rate))
         self.tokens = float(self.capacity)
         self.timestamp = time.monotonic()
-        self.lock = threading.Lock()
+        self.cv = threading.Condition()
 
     def acquire(self):
-        while True:
-            with self.lock:
+        with self.cv:
+            while True:
                 now = time.monotonic()
                 elapsed = now - self.timestamp
                 self.timestamp = now
                 self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
                 if self.tokens >= 1.0:
                     self.tokens -= 1.0
+                    # 仍有余量时只唤醒一个等待者，避免惊群
+                    if self.tokens >= 1.0:
+                        self.cv.notify()
                     return
-                need = (1.0 - self.tokens) / self.rate
-            time.sleep(max(need, 0.001))
+                self.cv.wait(timeout=(1.0 - self.tokens) / self.rate)
+
+    def throttle(self, factor: float = 0.5, duration: float = 60.0) -> None:
+        """临时把速率降为初始速率的 factor 倍，duration 秒后恢复
+
+        降速期间的重复调用（多个线程同时被限流）直接忽略，不叠加降速也不重新计时。
+        """
+        with self.cv:
+            if self._restore_timer is not None:
+                return
+            self.rate = max(0.1, self.base_rate * factor)
+            self._restore_timer = threading.Timer(duration, self._restore)
+            self._restore_timer.daemon = True
+            self._restore_timer.start()
+
+    def pause(self, seconds: float) -> None:
+        """让后续请求至少等待 seconds 秒（用于服务端 Retry-After）"""
+        with self.cv:
+            self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
+
+    def _restore(self) -> None:
+        with self.cv:
+            self.rate = self.base_rate
+            self._restore_timer = None
+            self.cv.notify_all()
+
+
+# ==================== 缓存 ====================
+
+class SqliteCache(MutableMapping):
+    """SQLite 键值缓存：每次写入只插入一行，无需整体重写缓存文件
+
+    值以 JSON 文本存储；连接在线程间共享，由锁串行化访问。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cache(k TEXT PRIMARY KEY, v TEXT)")
+
+    def __getitem__(self, key: str) -> Any:
+        with self.lock:
+            row = self.conn.execute("SELECT v FROM cache WHERE k=?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return _loads(row[0])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        data = _dumps(value).decode("utf-8")
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO cache VALUES(?, ?)", (key, data))
+
+    def __delitem__(self, key: str) -> None:
+        with self.lock:
+            cur = self.conn.execute("DELETE FROM cache WHERE k=?", (key,))
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM cache WHERE k=?", (key,)).fetchone()
+        return row is not None
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            keys = [row[0] for row in self.conn.execute("SELECT k FROM cache")]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def known_good_keys(self) -> set:
+        """返回所有缓存了有效结果（非 null）的键"""
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT k FROM cache WHERE v != 'null'")}
+
+    def update_many(self, items: Dict[str, Any], replace: bool = False) -> None:
+        """单个事务内批量写入（用于导入旧版 JSON 缓存）；replace=True 时先清空已有条目"""
+        rows = [(k, _dumps(v).decode("utf-8")) for k, v in items.items()]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            if replace:
+                self.conn.execute("DELETE FROM cache")
+            self.conn.executemany("INSERT OR REPLACE INTO cache VALUES(?, ?)", rows)
+            self.conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+def _mtime(path: str) -> float:
+    """文件修改时间，不存在时返回 0"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def open_cache(path: str) -> SqliteCache:
+    """
+    打开缓存；传入旧版 .json 缓存时使用同名 .db 文件
+    
+    .json 比 .db（含 WAL 文件）更新时，视为手工清理过的缓存，用其内容整体替换 .db，
+    这样按文档删除或清理 .json 中的条目后仍然生效。
+    """
+    if not path.endswith(".json"):
+        return SqliteCache(path)
+    
+    db_path = path[:-len(".json")] + ".db"
+    db_mtime = max(_mtime(db_path), _mtime(db_path + "-wal"))
+    cache = SqliteCache(db_path)
+    if os.path.exists(path) and (_mtime(path) > db_mtime or len(cache) == 0):
+        try:
+            with open(path, "rb") as f:
+                cache.update_many(_loads(f.read()), replace=True)
+            print(f"已导入 JSON 缓存: {path} -> {cache.path}")
+        except Exception as e:
+            print(f"⚠️ 无法导入 JSON 缓存 {path}: {e}")
+    return cache
 
 
 # ==================== 验证函数 ====================
 
 def validate_locality_match(
-    query_levels: List[str], 
+    query_levels: Sequence[str], 
     result: Dict[str, Any],
-    verbose: bool = False
+    verbose: bool = False,
+    parts: Optional[Tuple[str, str, str, int, str]] = None,
 ) -> bool:
-    """验证返回结果的行政区是否与查询一致"""
+    """验证返回结果的行政区是否与查询一致（parts 为 level_parts 的预计算结果）"""
     result_locality = result.get("locality", "")
     result_formatted = result.get("display_name", "") or ""
     
-    query_province = query_levels[0] if len(query_levels) >= 1 else ""
-    query_city = query_levels[1] if len(query_levels) >= 2 else ""
-    query_district = query_levels[2] if len(query_levels) >= 3 else ""
+    query_province, query_city, query_district, _, query_city_base = parts or level_parts(query_levels)
     
     if result_locality:
         if query_district and query_district not in result_locality and query_district not in result_formatted:
@@ -146,7 +277,6 @@ def validate_locality_match(
                 print(f"  ⚠️ locality 不匹配: 查询={query_district}, 返回={result_locality}")
             return False
         if query_city and query_city not in result_formatted:
-            query_city_base = query_city.replace("市", "").replace("地区", "").replace("自治州", "")
             if query_city_base and query_city_base not in result_formatted:
                 if verbose:
                     print(f"  ⚠️ city 不匹配: 查询={query_city}, 返回={result_formatted}")
@@ -155,34 +285,34 @@ def validate_locality_match(
 
 
 def validate_coordinate_distance(
-    query_levels: List[str],
+    query_levels: Sequence[str],
     result: Dict[str, Any],
-    verbose: bool = False
+    verbose: bool = False,
+    parts: Optional[Tuple[str, str, str, int, str]] = None,
 ) -> bool:
-    """验证返回坐标是否在合理距离范围内"""
+    """验证返回坐标是否在合理距离范围内（parts 为 level_parts 的预计算结果）"""
     result_lat = result.get("lat")
     result_lon = result.get("lon")
     
     if not result_lat or not result_lon:
         return True
     
-    query_city = query_levels[1] if len(query_levels) >= 2 else None
+    _, query_city, _, depth, _ = parts or level_parts(query_levels)
     
     if not query_city or query_city not in CITY_CENTERS:
         return True
     
-    city_lat, city_lon = CITY_CENTERS[query_city]
-    distance = haversine_distance(city_lat, city_lon, result_lat, result_lon)
-    
-    if len(query_levels) >= 4:
+    if depth >= 4:
         max_dist = MAX_DISTANCE["street"]
-    elif len(query_levels) >= 3:
+    elif depth >= 3:
         max_dist = MAX_DISTANCE["district"]
-    elif len(query_levels) >= 2:
+    elif depth >= 2:
         max_dist = MAX_DISTANCE["city"]
     else:
         max_dist = MAX_DISTANCE["province"]
     
+    distance = city_distance_km(query_city, result_lat, result_lon, max_dist)
+    
     if distance > max_dist:
         if verbose:
             print(f"  ⚠️ 距离异常: {query_city}中心 → 结果 = {distance:.1f}km (阈值: {max_dist}km)")
@@ -193,21 +323,106 @@ def validate_coordinate_distance(
 
 # ==================== 高德 API 客户端 ====================
 
+USER_AGENT = "geolore-tools/1.0"
+
+
+# 高德限流类 infocode：10004 访问过于频繁，10019-10021 QPS 超限（降速后重试）
+RATE_LIMIT_INFOCODES = {"10004", "10019", "10020", "10021"}
+
+# 10003 日配额超限：当天重试不会成功，直接抛出 AmapThrottledError
+QUOTA_INFOCODES = {"10003"}
+
+# 被限流时的重试次数与降速参数
+THROTTLE_RETRIES = 3
+THROTTLE_FACTOR = 0.5
+THROTTLE_SECONDS = 60.0
+
+
+class AmapThrottledError(RuntimeError):
+    """重试用尽后仍被限流；调用方不应把它当作“未找到”写入缓存"""
+
+
+def _parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """解析 Retry-After 头（仅支持秒数形式）"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
 class AmapClient:
     """高德地图 API 客户端"""
     
-    def __init__(self, api_key: str, rate_limit: float = 30.0):
+    def __init__(self, api_key: str, rate_limit: float = 30.0, pool_maxsize: int = 32):
         self.api_key = api_key
         self.limiter = RateLimiter(rate_limit)
-        self.user_agent = "geolore-tools/1.0"
+        self.user_agent = USER_AGENT
+        # 连接池：同一进程内的所有 AmapClient 共享到 restapi.amap.com 的 HTTPS 长连接，
+        # maxsize 应不小于并发线程数
+        self.pool = get_pool(USER_AGENT, pool_maxsize)
+        # 进行中的请求：相同请求并发到达时只发一次，其余线程等待同一个 Future
+        self._inflight: Dict[Tuple, Future] = {}
+        self._inflight_lock = threading.Lock()
+    
+    def _single_flight(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+        """合并并发的相同请求"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return future.result()
     
     def _http_get(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """发送 HTTP GET 请求"""
-        self.limiter.acquire()
+        """发送 HTTP GET 请求；被限流时降低速率并重试，重试用尽抛出 AmapThrottledError"""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            status, retry_after, body = self._request(url, params)
+            
+            if status in (429, 503):
+                # HTTP 层限流：按 Retry-After 暂停并降速
+                if attempt >= THROTTLE_RETRIES:
+                    raise AmapThrottledError(f"HTTP {status}: 请求被限流")
+                self.limiter.pause(_parse_retry_after(retry_after))
+            else:
+                data = _loads(body)
+                infocode = str(data.get("infocode"))
+                if infocode in QUOTA_INFOCODES:
+                    raise AmapThrottledError(f"infocode {infocode}: {data.get('info')}")
+                if infocode not in RATE_LIMIT_INFOCODES:
+                    return data
+                # 业务层限流（status=0）：降速后重试，避免把限流当作"未找到"写入缓存
+                if attempt >= THROTTLE_RETRIES:
+                    raise AmapThrottledError(f"infocode {infocode}: {data.get('info')}")
+            self.limiter.throttle(THROTTLE_FACTOR, THROTTLE_SECONDS)
+            attempt += 1
+    
+    def _request(self, url: str, params: Dict[str, Any]) -> Tuple[int, Optional[str], bytes]:
+        """发送一次请求，返回 (HTTP 状态码, Retry-After 头, 响应体)"""
+        if self.pool is not None:
+            resp = self.pool.request("GET", url, fields=params, timeout=20)
+            if resp.status not in (429, 503):
+                raise_for_status(url, resp)
+            return resp.status, resp.headers.get("Retry-After"), resp.data
         full_url = f"{url}?{urllib.parse.urlencode(params)}"
         req = urllib.request.Request(full_url, headers={"User-Agent": self.user_agent})
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            return json.loads(resp.read().decode("utf-8"))
+        try:
+            with urllib.request.urlopen(req, timeout=20) as resp:
+                return resp.status, resp.headers.get("Retry-After"), resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code in (429, 503):
+                return e.code, e.headers.get("Retry-After"), b""
+            raise
     
     def place_search(
         self, 
@@ -222,12 +437,17 @@ class AmapClient:
             "offset": 1,
             "page": 1,
             "citylimit": "true" if citylimit else "false",
+            # 只需 location/name/pname/cityname/adname/id，显式请求精简字段
+            "extensions": "base",
             "output": "JSON",
         }
         if city:
             params["city"] = city
         
-        data = self._http_get("https://restapi.amap.com/v3/place/text", params)
+        url = "https://restapi.amap.com/v3/place/text"
+        data = self._single_flight(
+            (url, keywords, city, citylimit), lambda: self._http_get(url, params)
+        )
         
         if str(data.get("status")) != "1":
             return []
@@ -247,7 +467,10 @@ class AmapClient:
         if city:
             params["city"] = city
         
-        data = self._http_get("https://restapi.amap.com/v3/geocode/geo", params)
+        url = "https://restapi.amap.com/v3/geocode/geo"
+        data = self._single_flight(
+            (url, address, city), lambda: self._http_get(url, params)
+        )
         
         if str(data.get("status")) != "1":
             return []
@@ -327,6 +550,7 @@ def geocode_with_fallback(
     cache: Dict[str, Any],
     enable_validation: bool = True,
     verbose: bool = False,
+    known_good: Optional[set] = None,
 ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
     """
     分级回退地理编码
@@ -339,6 +563,8 @@ def geocode_with_fallback(
         cache: 缓存字典
         enable_validation: 是否启用结果验证
         verbose: 是否打印详细日志
+        known_good: 已有有效结果的缓存键集合；传入时，若某个上级前缀已有结果，
+            则直接复用该结果，不再为更细的层级调用 API（会降低精度，默认关闭）
     
     Returns:
         (result, meta) - result 为地理编码结果，meta 为元数据
@@ -346,6 +572,7 @@ def geocode_with_fallback(
     levels = split_address_levels(address)
     if not levels:
         return None, {"matchLevel": None, "matchMethod": None}
+    parts = level_parts(levels)
     
     meta = {
         "matchLevel": None,
@@ -353,19 +580,22 @@ def geocode_with_fallback(
         "validationPassed": None,
     }
     
+    # 预先构建各级前缀查询串，回退时直接取用
+    prefixes = [""]
+    for level in levels:
+        prefixes.append(prefixes[-1] + level)
+    city = levels[0]  # 使用第一级作为 city 参数
+    
     # 从完整地址开始，逐级回退
     for num_levels in range(len(levels), 0, -1):
-        query_parts = levels[:num_levels]
-        query = "".join(query_parts)
-        city = query_parts[0]  # 使用第一级作为 city 参数
-        
+        query = prefixes[num_levels]
         level_index = len(levels) - num_levels
         
         if verbose:
             print(f"  尝试 [{num_levels}级]: {query} (city={city})")
         
         # 检查缓存
-        cache_key = f"amap:{query}"
+        cache_key = "amap:" + query
         if cache_key in cache:
             cached = cache[cache_key]
             if cached:
@@ -380,6 +610,18 @@ def geocode_with_fallback(
                     print(f"    ✗ 缓存未命中（之前查询失败）")
                 continue
         
+        # 上级前缀已有结果时直接复用，跳过中间各级的 API 调用
+        if known_good:
+            for parent_levels in range(num_levels - 1, 0, -1):
+                parent_key = "amap:" + prefixes[parent_levels]
+                if parent_key in known_good:
+                    if verbose:
+                        print(f"    ✓ 复用上级缓存 [{parent_levels}级]: {prefixes[parent_levels]}")
+                    meta["matchLevel"] = len(levels) - parent_levels
+                    meta["matchMethod"] = "cache_prefix"
+                    meta["validationPassed"] = True
+                    return cache[parent_key], meta
+        
         # 调用 API
         try:
             # 优先使用地点搜索
@@ -390,8 +632,8 @@ def geocode_with_fallback(
                 
                 # 验证结果
                 if enable_validation:
-                    locality_ok = validate_locality_match(levels, result, verbose)
-                    distance_ok = validate_coordinate_distance(levels, result, verbose)
+                    locality_ok = validate_locality_match(levels, result, verbose, parts)
+                    distance_ok = validate_coordinate_distance(levels, result, verbose, parts)
                     
                     if not locality_ok or not distance_ok:
                         if verbose:
@@ -401,6 +643,8 @@ def geocode_with_fallback(
                 
                 # 缓存结果
                 cache[cache_key] = result
+                if known_good is not None:
+                    known_good.add(cache_key)
                 
                 if verbose:
                     print(f"    ✓ 成功: ({result.get('lat')}, {result.get('lon')})")
@@ -417,8 +661,8 @@ def geocode_with_fallback(
                 result = client.normalize_geocode(geocodes[0])
                 
                 if enable_validation:
-                    locality_ok = validate_locality_match(levels, result, verbose)
-                    distance_ok = validate_coordinate_distance(levels, result, verbose)
+                    locality_ok = validate_locality_match(levels, result, verbose, parts)
+                    distance_ok = validate_coordinate_distance(levels, result, verbose, parts)
                     
                     if not locality_ok or not distance_ok:
                         if verbose:
@@ -427,6 +671,8 @@ def geocode_with_fallback(
                         continue
                 
                 cache[cache_key] = result
+                if known_good is not None:
+                    known_good.add(cache_key)
                 
                 if verbose:
                     print(f"    ✓ 成功 (geocode): ({result.get('lat')}, {result.get('lon')})")
@@ -441,6 +687,14 @@ def geocode_with_fallback(
             if verbose:
                 print(f"    ✗ 未找到")
                 
+        except AmapThrottledError as e:
+            # 限流不代表地址不存在，不写缓存，下次运行时重新查询
+            if verbose:
+                print(f"    ✗ 限流: {e}")
+        except TRANSPORT_ERRORS as e:
+            # 网络错误同样是暂时性的，不写缓存
+            if verbose:
+                print(f"    ✗ 网络错误: {e}")
         except Exception as e:
             cache[cache_key] = None
             if verbose:
@@ -451,6 +705,12 @@ def geocode_with_fallback(
 
 # ==================== 主函数 ====================
 
+def _warmup_key(address: str) -> Tuple[Tuple[str, ...], int]:
+    """处理顺序排序键：按 (省, 市) 分组，组内地址层级少的在前"""
+    levels = split_address_levels(address)
+    return levels[:2], len(levels)
+
+
 def main():
     import argparse
     
@@ -458,10 +718,13 @@ def main():
     parser.add_argument("--input", "-i", required=True, help="输入 JSON 文件")
     parser.add_argument("--output", "-o", required=True, help="输出 JSON 文件")
     parser.add_argument("--amap-key", required=True, help="高德 API Key")
-    parser.add_argument("--cache", default="geocode_cache.json", help="缓存文件路径")
+    parser.add_argument("--cache", default="geocode_cache.db", help="缓存文件路径（SQLite；传入 .json 时导入到同名 .db）")
     parser.add_argument("--enable-validation", action="store_true", help="启用结果验证")
     parser.add_argument("--disable-validation", action="store_true", help="禁用结果验证")
     parser.add_argument("--rate-limit", type=float, default=30.0, help="API 请求速率限制 (rps)")
+    parser.add_argument("--workers", type=int, help="并发请求线程数（默认: min(rate-limit, 16)）")
+    parser.add_argument("--reuse-parent-cache", action="store_true",
+                        help="上级地址已有缓存结果时直接复用，不再查询更细层级（更快但精度更低）")
     parser.add_argument("--verbose", "-v", action="store_true", help="详细输出")
     args = parser.parse_args()
     
@@ -470,37 +733,36 @@ def main():
         enable_validation = True
     
     # 读取输入
-    with open(args.input, "r", encoding="utf-8") as f:
-        items = json.load(f)
+    with open(args.input, "rb") as f:
+        items = _loads(f.read())
     
-    # 加载缓存
-    cache = {}
-    if os.path.exists(args.cache):
-        try:
-            with open(args.cache, "r", encoding="utf-8") as f:
-                cache = json.load(f)
-        except Exception:
-            pass
+    # 打开缓存（逐条写入 SQLite，无需定期整体保存）
+    cache = open_cache(args.cache)
     
     # 初始化客户端
-    client = AmapClient(args.amap_key, args.rate_limit)
+    workers = args.workers or max(1, min(int(args.rate_limit), 16))
+    client = AmapClient(args.amap_key, args.rate_limit, pool_maxsize=max(32, workers))
     
     print(f"输入: {args.input} ({len(items)} 条)")
     print(f"验证: {'启用' if enable_validation else '禁用'}")
-    print(f"缓存: {args.cache}")
+    print(f"缓存: {cache.path}")
+    
+    # 已有有效结果的前缀索引（仅 --reuse-parent-cache 时构建）
+    known_good = cache.known_good_keys() if args.reuse_parent_cache else None
     
-    # 处理每个地点
-    results = []
+    # 处理每个地点（多线程并发请求，共享客户端与限速器）
+    total = len(items)
+    results: List[Optional[Dict[str, Any]]] = [None] * total
     success = 0
     failed = 0
     
-    for i, item in enumerate(items):
+    def process(i: int, item: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
         title = item.get("title", "")
         address = item.get("address", "")
         synopsis = item.get("synopsis", "")
         
         if args.verbose:
-            print(f"\n[{i+1}/{len(items)}] {title}")
+            print(f"\n[{i+1}/{total}] {title}")
         
         result, meta = geocode_with_fallback(
             client=client,
@@ -508,6 +770,7 @@ def main():
             cache=cache,
             enable_validation=enable_validation,
             verbose=args.verbose,
+            known_good=known_good,
         )
         
         output_item = {
@@ -526,25 +789,28 @@ def main():
             output_item["matchLevel"] = meta.get("matchLevel")
             output_item["matchMethod"] = meta.get("matchMethod")
             output_item["validationPassed"] = meta.get("validationPassed")
-            success += 1
-        else:
-            failed += 1
         
-        results.append(output_item)
-        
-        # 定期保存缓存
-        if (i + 1) % 10 == 0:
-            with open(args.cache, "w", encoding="utf-8") as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+        return output_item, bool(result)
+    
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        # 同省市的条目集中提交、组内短地址优先，让上级查询先写入缓存；
+        # 结果按原下标回填，输出顺序不变
+        order = sorted(range(total), key=lambda i: _warmup_key(items[i].get("address", "")))
+        futures = {ex.submit(process, i, items[i]): i for i in order}
+        for future in as_completed(futures):
+            output_item, ok = future.result()
+            results[futures[future]] = output_item
+            if ok:
+                success += 1
+            else:
+                failed += 1
     
-    # 保存最终缓存
-    with open(args.cache, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+    cache.close()
     
     # 保存输出
     os.makedirs(os.path.dirname(os.path.abspath(args.output)) or ".", exist_ok=True)
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    with open(args.output, "wb") as f:
+        f.write(_dumps(results, indent=True))
     
     print(f"\n✓ 完成: {args.output}")
     print(f"  成功: {success}/{len(items)}")
@@ -12,13 +12,28 @@ OSM Nominatim 地理编码器 - 使用 OpenStreetMap 免费 API 进行地理编
 
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
 import os
+import sys
 import time
 import urllib.parse
 import urllib.request
 from typing import Dict, List, Optional
 
+try:
+    from ..common.jsonio import dumps as _dumps, loads as _loads
+    from ..common.ratelimit import IntervalLimiter
+except ImportError:  # 以脚本方式运行或以 src 为导入根时没有上级包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.jsonio import dumps as _dumps, loads as _loads
+    from common.ratelimit import IntervalLimiter
+
+try:
+    from ._http import get_pool, raise_for_status
+except ImportError:  # 作为脚本直接运行时没有包上下文
+    from _http import get_pool, raise_for_status
+
 
 USER_AGENT = "geolore-geocoder/0.1 (+https://github.com/jrenc2002/geolore-tools)"
 
@@ -49,13 +64,19 @@ def nominatim_search(
         "limit": limit,
         "accept-language": lang
     }
+    pool = get_pool(USER_AGENT)
+    if pool is not None:
+        resp = pool.request("GET", base, fields=params, timeout=timeout)
+        raise_for_status(base, resp)
+        return _loads(resp.data)
+    
     url = f"{base}?{urllib.parse.urlencode(params)}"
     
     req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
     
     with urllib.request.urlopen(req, timeout=timeout) as resp:
         data = resp.read()
-        return json.loads(data.decode("utf-8"))
+        return _loads(data)
 
 
 def parse_nominatim_result(item: Dict) -> Dict:
@@ -119,6 +140,25 @@ def geocode_single(
         return None
 
 
+def _load_cache(cache_path: Optional[str]) -> Dict:
+    """读取缓存文件，不存在或损坏时返回空字典"""
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                return _loads(f.read())
+        except Exception:
+            return {}
+    return {}
+
+
+def _save_cache(cache: Dict, cache_path: str) -> None:
+    """原子写入缓存（先写临时文件再替换，中断时不会留下半截文件）"""
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_dumps(cache, indent=True))
+    os.replace(tmp_path, cache_path)
+
+
 def geocode_batch(
     names: List[str],
     cache_path: Optional[str] = None,
@@ -138,16 +178,14 @@ def geocode_batch(
         {地名: 地点信息} 字典
     """
     # 加载缓存
-    cache = {}
-    if cache_path and os.path.exists(cache_path):
-        try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                cache = json.load(f)
-        except Exception:
-            cache = {}
+    cache = _load_cache(cache_path)
     
     results = {}
     
+    # 缓存目录只需创建一次，不在逐条写缓存时重复检查
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    
     for name in names:
         if not name:
             continue
@@ -166,9 +204,7 @@ def geocode_batch(
         
         # 写入缓存
         if cache_path:
-            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
-            with open(cache_path, "w", encoding="utf-8") as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+            _save_cache(cache, cache_path)
         
         # 速率限制
         time.sleep(sleep_sec)
@@ -176,6 +212,68 @@ def geocode_batch(
     return results
 
 
+async def geocode_batch_async(
+    names: List[str],
+    cache_path: Optional[str] = None,
+    sleep_sec: float = 1.0,
+    workers: int = 1,
+    lang: str = "zh-CN",
+    save_every: int = 20
+) -> Dict[str, Optional[Dict]]:
+    """
+    并发批量地理编码（多个 worker 从队列取地名）
+    
+    所有 worker 共享一个限速器，总请求速率为 workers / sleep_sec 次每秒。
+    公共 Nominatim 服务要求不超过 1 次/秒，应保持 workers=1；
+    自建实例可以调大 workers。
+    
+    Args:
+        names: 地名列表
+        cache_path: 缓存文件路径
+        sleep_sec: 单个 worker 的请求间隔（秒）
+        workers: 并发 worker 数
+        lang: 语言代码
+        save_every: 每完成多少次请求写一次缓存（结束时总会再写一次）
+    
+    Returns:
+        {地名: 地点信息} 字典，键顺序与 names 一致
+    """
+    cache = _load_cache(cache_path)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    for name in dict.fromkeys(names):
+        if name and name not in cache:
+            queue.put_nowait(name)
+    
+    workers = max(1, workers)
+    limiter = IntervalLimiter(sleep_sec / workers)
+    completed = 0
+    
+    async def worker() -> None:
+        nonlocal completed
+        while True:
+            try:
+                name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await limiter.wait()
+            print(f"Geocoding: {name}...")
+            # urllib 为阻塞调用，放到线程中执行
+            cache[name] = await asyncio.to_thread(geocode_single, name, lang)
+            completed += 1
+            if cache_path and completed % save_every == 0:
+                _save_cache(cache, cache_path)
+    
+    if not queue.empty():
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if cache_path:
+            _save_cache(cache, cache_path)
+    
+    return {name: cache.get(name) for name in names if name}
+
+
 def generate_client_id(rec: Dict, fallback_name: str) -> str:
     """
     生成稳定的 clientId
@@ -193,6 +291,5 @@ def generate_client_id(rec: Dict, fallback_name: str) -> str:
     if osm_type and osm_id:
         return f"osm-{osm_type}-{osm_id}"
     
-    import hashlib
     h = hashlib.sha1(fallback_name.encode("utf-8")).hexdigest()[:10]
     return f"name-{h}"
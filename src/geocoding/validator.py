@@ -12,53 +12,16 @@
 
 from __future__ import annotations
 
-import math
+import re
+import sys
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 
+try:
+    from ._cities import CITY_CENTERS, city_distance_km
+except ImportError:  # 作为脚本直接运行时没有包上下文
+    from _cities import CITY_CENTERS, city_distance_km
 
-# 中国主要城市中心点坐标（用于距离验证）
-CITY_CENTERS = {
-    "北京市": (39.9042, 116.4074),
-    "上海市": (31.2304, 121.4737),
-    "广州市": (23.1291, 113.2644),
-    "深圳市": (22.5431, 114.0579),
-    "杭州市": (30.2741, 120.1551),
-    "南京市": (32.0603, 118.7969),
-    "成都市": (30.5728, 104.0668),
-    "重庆市": (29.4316, 106.9123),
-    "武汉市": (30.5928, 114.3055),
-    "西安市": (34.3416, 108.9398),
-    "苏州市": (31.2989, 120.5853),
-    "天津市": (39.0842, 117.2009),
-    "南平市": (26.6417, 118.1780),
-    "福州市": (26.0745, 119.2965),
-    "长沙市": (28.2282, 112.9388),
-    "郑州市": (34.7472, 113.6249),
-    "济南市": (36.6512, 117.1201),
-    "青岛市": (36.0671, 120.3826),
-    "沈阳市": (41.8057, 123.4315),
-    "大连市": (38.9140, 121.6147),
-    "哈尔滨市": (45.8038, 126.5350),
-    "长春市": (43.8171, 125.3235),
-    "昆明市": (24.8801, 102.8329),
-    "贵阳市": (26.6470, 106.6302),
-    "南昌市": (28.6820, 115.8579),
-    "合肥市": (31.8206, 117.2272),
-    "石家庄市": (38.0428, 114.5149),
-    "太原市": (37.8706, 112.5489),
-    "兰州市": (36.0611, 103.8343),
-    "乌鲁木齐市": (43.8256, 87.6168),
-    "拉萨市": (29.6500, 91.1000),
-    "西宁市": (36.6171, 101.7782),
-    "银川市": (38.4872, 106.2309),
-    "呼和浩特市": (40.8428, 111.7500),
-    "南宁市": (22.8170, 108.3665),
-    "海口市": (20.0444, 110.1999),
-    "温州市": (28.0016, 120.6722),
-    "宁波市": (29.8683, 121.5440),
-    "无锡市": (31.4912, 120.3119),
-    "厦门市": (24.4798, 118.0894),
-}
 
 # 合理距离阈值（单位：公里）
 MAX_DISTANCE_FROM_CITY = {
@@ -69,29 +32,32 @@ MAX_DISTANCE_FROM_CITY = {
 }
 
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    计算两点间的球面距离（单位：公里）
-    
-    Args:
-        lat1, lon1: 第一个点的纬度和经度
-        lat2, lon2: 第二个点的纬度和经度
-    
-    Returns:
-        距离（公里）
-    """
-    R = 6371  # 地球半径（公里）
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(delta_lat/2)**2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2)
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
+def _max_distance_for(query_levels: List[str]) -> int:
+    """根据查询层级确定合理距离阈值"""
+    if len(query_levels) >= 4:
+        return MAX_DISTANCE_FROM_CITY["street"]
+    if len(query_levels) >= 3:
+        return MAX_DISTANCE_FROM_CITY["district"]
+    if len(query_levels) >= 2:
+        return MAX_DISTANCE_FROM_CITY["city"]
+    return MAX_DISTANCE_FROM_CITY["province"]
+
+
+# 规范化用的预编译正则与字符删除表
+_CITY_SUFFIX_RE = re.compile(r"市|地区")
+_STRIP_PROVINCE_CITY = str.maketrans("", "", "省市")
+
+
+@lru_cache(maxsize=4096)
+def _canon_query_city(city: str) -> str:
+    """查询城市名的规范形式（去掉 市/地区），每个城市只计算一次"""
+    return _CITY_SUFFIX_RE.sub("", city)
+
+
+@lru_cache(maxsize=8192)
+def _canon_formatted(formatted: str) -> str:
+    """返回地址的规范形式（去掉 省/市），同一结果重复验证时不再重算"""
+    return formatted.translate(_STRIP_PROVINCE_CITY)
 
 
 def validate_locality_match(query_levels: List[str], result: Dict) -> Tuple[bool, str]:
@@ -122,8 +88,8 @@ def validate_locality_match(query_levels: List[str], result: Dict) -> Tuple[bool
     
     # 检查2：formattedAddress 应该包含查询的上级行政区
     if result_formatted:
-        query_city_base = query_city.replace("市", "").replace("地区", "")
-        result_formatted_normalized = result_formatted.replace("省", "").replace("市", "")
+        query_city_base = _canon_query_city(query_city)
+        result_formatted_normalized = _canon_formatted(result_formatted)
         
         if query_city_base and query_city_base not in result_formatted_normalized:
             return False, f"formattedAddress 不包含查询城市: 查询={query_city}, 返回={result_formatted}"
@@ -154,18 +120,9 @@ def validate_coordinate_distance(query_levels: List[str], result: Dict) -> Tuple
     if not query_city or query_city not in CITY_CENTERS:
         return True, "无参考坐标，跳过检查"
     
-    city_lat, city_lon = CITY_CENTERS[query_city]
-    distance = haversine_distance(city_lat, city_lon, result_lat, result_lon)
-    
-    # 根据查询层级确定合理距离阈值
-    if len(query_levels) >= 4:
-        max_distance = MAX_DISTANCE_FROM_CITY["street"]
-    elif len(query_levels) >= 3:
-        max_distance = MAX_DISTANCE_FROM_CITY["district"]
-    elif len(query_levels) >= 2:
-        max_distance = MAX_DISTANCE_FROM_CITY["city"]
-    else:
-        max_distance = MAX_DISTANCE_FROM_CITY["province"]
+    max_distance = _max_distance_for(query_levels)
+    # 与 amap 相同：平面近似，接近阈值时用 haversine 复核
+    distance = city_distance_km(query_city, result_lat, result_lon, max_distance)
     
     if distance > max_distance:
         return False, f"距离异常: {query_city}中心 → 结果坐标 = {distance:.1f}km (阈值: {max_distance}km)"
@@ -223,4 +180,13 @@ def parse_address_levels(address: str, separator: str = "-") -> List[str]:
     Returns:
         层级列表
     """
-    return [level.strip() for level in address.split(separator) if level.strip()]
+    if not isinstance(address, str):
+        # 不可哈希的输入（如 LLM 输出中的列表）不走缓存
+        return list(_split_levels.__wrapped__(address, separator))
+    return list(_split_levels(address, separator))
+
+
+@lru_cache(maxsize=8192)
+def _split_levels(address: str, separator: str) -> Tuple[str, ...]:
+    """parse_address_levels 的缓存实现，层级字符串经 sys.intern 驻留"""
+    return tuple(sys.intern(level.strip()) for level in address.split(separator) if level.strip())
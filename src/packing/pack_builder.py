@@ -12,13 +12,20 @@
 
 from __future__ import annotations
 
-import json
 import os
+import sys
 import re
 import hashlib
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 
+try:
+    from ..common.jsonio import dumps as _dumps
+except ImportError:  # 以脚本方式运行或以 src 为导入根时没有上级包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.jsonio import dumps as _dumps
+
 
 @dataclass
 class PackConfig:
@@ -39,14 +46,22 @@ class PackConfig:
     tags: Optional[List[str]] = None
 
 
+# 连续空白折叠为单个空格
+_WS_RE = re.compile(r"\s+")
+
+
 def truncate_text(s: str, max_chars: int) -> str:
     """截断文本到指定长度"""
-    s = re.sub(r"\s+", " ", (s or "").strip())
+    s = _WS_RE.sub(" ", (s or "").strip())
     return s if len(s) <= max_chars else s[: max_chars - 1] + "…"
 
 
+@lru_cache(maxsize=16384)
 def generate_client_id(prefix: str, name: str) -> str:
-    """生成稳定的 clientId"""
+    """生成稳定的 clientId（同名地点重复出现时直接命中缓存）
+
+    哈希算法须保持 sha1：更换算法会改变已发布内容包中的 clientId。
+    """
     h = hashlib.sha1(name.encode("utf-8")).hexdigest()[:10]
     return f"{prefix}-{h}"
 
@@ -83,20 +98,24 @@ def build_place(
         else:
             client_id = generate_client_id("place", name)
     
+    get = geocode_result.get
     place = {
         "clientId": client_id,
         "title": name,
-        "latitude": geocode_result.get("lat") or geocode_result.get("latitude"),
-        "longitude": geocode_result.get("lon") or geocode_result.get("longitude"),
+        "latitude": get("lat") or get("latitude"),
+        "longitude": get("lon") or get("longitude"),
     }
     
-    # 可选字段
-    if geocode_result.get("locality"):
-        place["locality"] = geocode_result["locality"]
-    if geocode_result.get("countryCode"):
-        place["countryCode"] = geocode_result["countryCode"]
-    if geocode_result.get("formattedAddress") or geocode_result.get("display_name"):
-        place["formattedAddress"] = geocode_result.get("formattedAddress") or geocode_result.get("display_name")
+    # 可选字段（每个字段只查一次）
+    locality = get("locality")
+    if locality:
+        place["locality"] = locality
+    country_code = get("countryCode")
+    if country_code:
+        place["countryCode"] = country_code
+    formatted_address = get("formattedAddress") or get("display_name")
+    if formatted_address:
+        place["formattedAddress"] = formatted_address
     if synopsis:
         place["synopsis"] = synopsis
     if timeline:
@@ -255,33 +274,78 @@ def build_content_pack(
     return content_pack
 
 
-def write_content_pack(content_pack: Dict, output_path: str) -> None:
+# 已创建过的输出目录，避免批量写出多个内容包时重复 makedirs
+_created_dirs = set()
+
+
+def _ensure_dir(path: str) -> None:
+    """确保目录存在（同一进程内每个目录只创建一次）"""
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+
+
+def write_content_pack(content_pack: Dict, output_path: str, compact: bool = False) -> None:
     """
     写入内容包到文件
     
     Args:
         content_pack: 内容包字典
         output_path: 输出文件路径
+        compact: 是否输出紧凑 JSON（无缩进，体积约减半，适合仅供程序读取的中间文件）
     """
-    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(content_pack, f, ensure_ascii=False, indent=2)
+    _ensure_dir(os.path.dirname(output_path) or ".")
+    with open(output_path, "wb") as f:
+        f.write(_dumps(content_pack, indent=not compact))
 
 
-def merge_places(places_list: List[Dict], key: str = "clientId") -> List[Dict]:
+def merge_places(
+    places_list: List[Dict],
+    key: str = "clientId",
+    geo_precision: Optional[int] = None,
+    aliases: Optional[Dict[str, str]] = None,
+) -> List[Dict]:
     """
     合并去重 places
     
     Args:
         places_list: place 列表
         key: 去重键
+        geo_precision: 设置时，标题相同且坐标四舍五入到该小数位后相同的记录
+            也视为同一地点（如 OSM ID 与生成 ID 不同的同一地点）；
+            保留首次出现的记录，并用后者补全其缺失字段
+        aliases: 传入字典时，记录被合并掉的 clientId → 保留的 clientId，
+            供调用方改写 mapPlaces 中的引用
     
     Returns:
-        去重后的 place 列表
+        去重后的 place 列表（保持首次出现顺序）
     """
-    seen = {}
+    seen: Dict[Any, Dict] = {}
+    seen_by_geo: Dict[tuple, Dict] = {}
     for place in places_list:
         k = place.get(key)
-        if k and k not in seen:
-            seen[k] = place
+        if not k:
+            continue
+        if k in seen:
+            continue
+        
+        if geo_precision is not None:
+            lat = place.get("latitude")
+            lon = place.get("longitude")
+            if lat is not None and lon is not None:
+                geo_key = (
+                    str(place.get("title") or "").strip().lower(),
+                    round(float(lat), geo_precision),
+                    round(float(lon), geo_precision),
+                )
+                existing = seen_by_geo.get(geo_key)
+                if existing is not None:
+                    for field, value in place.items():
+                        existing.setdefault(field, value)
+                    if aliases is not None:
+                        aliases[k] = existing.get(key)
+                    continue
+                seen_by_geo[geo_key] = place
+        
+        seen[k] = place
     return list(seen.values())
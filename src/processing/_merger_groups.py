@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+merger.py 的分组内循环（按 title 统计 address 票数、去重收集 story）
+
+本模块只用标注完整的内置类型（str / int / dict / list），可直接用 mypyc 编译：
+  cd src/processing && mypyc _merger_groups.py
+编译产物（.so / .pyd）与本文件同名，导入时优先生效；未编译时按普通 Python 执行。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+Groups = Tuple[Dict[str, int], List[Dict[str, int]], List[Dict[str, bool]]]
+
+
+def group_outputs(records: Iterable[Any]) -> Groups:
+    """
+    按列存储（SoA）分组：title → 下标，address 计数与 story 集合放在并行列表中
+
+    Args:
+        records: parse_jsonl 产出的每行对象
+
+    Returns:
+        (title_to_idx, address_counts, stories_seen)；
+        address_counts 与 stories_seen 均为保持插入顺序的 dict
+    """
+    title_to_idx: Dict[str, int] = {}
+    address_counts: List[Dict[str, int]] = []
+    stories_seen: List[Dict[str, bool]] = []
+
+    for obj in records:
+        if not isinstance(obj, dict):
+            continue
+        outputs = obj.get("output")
+        if not isinstance(outputs, list):
+            continue
+
+        for item in outputs:
+            if not isinstance(item, dict):
+                continue
+
+            title = item.get("title")
+            address = item.get("address")
+            story = item.get("story")
+
+            # 验证字段类型
+            if not isinstance(title, str) or not isinstance(address, str) or not isinstance(story, str):
+                continue
+
+            title_key: str = title.strip()
+            if not title_key:
+                continue
+            address_val: str = address.strip()
+            story_val: str = story.strip()
+
+            # 获取或创建分组
+            idx = title_to_idx.get(title_key)
+            if idx is None:
+                idx = len(address_counts)
+                title_to_idx[title_key] = idx
+                address_counts.append({})
+                stories_seen.append({})
+
+            # 统计 address
+            if address_val:
+                counts = address_counts[idx]
+                counts[address_val] = counts.get(address_val, 0) + 1
+
+            # 去重添加 story
+            if story_val:
+                seen = stories_seen[idx]
+                if story_val not in seen:
+                    seen[story_val] = True
+
+    return title_to_idx, address_counts, stories_seen
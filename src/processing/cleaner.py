@@ -31,11 +31,23 @@ from __future__ import annotations
 import argparse
 import asyncio
 import json
+import mmap
 import os
+import sys
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
+try:
+    from ..common.jsonio import dumps as _dumps, loads as _loads
+    from ..common.tasks import run_bounded
+except ImportError:  # 以脚本方式运行或以 src 为导入根时没有上级包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.jsonio import dumps as _dumps, loads as _loads
+    from common.tasks import run_bounded
+
 
 def read_text(path: str) -> str:
     """读取文本文件"""
@@ -49,11 +61,16 @@ def read_json(path: str) -> Any:
         return json.load(f)
 
 
+# 已确认存在的目录，同一进程内每个目录只检查一次
+_created_dirs = set()
+
+
 def ensure_dir(path: str) -> None:
-    """确保目录存在"""
+    """确保文件所在目录存在"""
     d = os.path.dirname(os.path.abspath(path))
-    if d and not os.path.exists(d):
+    if d and d not in _created_dirs:
         os.makedirs(d, exist_ok=True)
+        _created_dirs.add(d)
 
 
 def chunk_list(items: List[Any], size: int) -> List[List[Any]]:
@@ -70,24 +87,137 @@ class APIConfig:
     timeout: float
 
 
+# 各服务商返回的剩余请求数 / 请求上限响应头（小写）
+REMAINING_HEADERS = ("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+LIMIT_HEADERS = ("x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit")
+
+
+def _header_number(headers: Any, names: Tuple[str, ...]) -> Optional[float]:
+    """读取第一个存在且可解析为数字的响应头"""
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class RateLimitedError(RuntimeError):
+    """HTTP 429：retry_after 为服务端建议的等待秒数（未提供时为 None）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class RateLimiter:
-    """简单的速率限制器"""
+    """滑动窗口速率限制器
+
+    统计最近 60 秒内的请求数（rps * 60 作为每分钟上限）及可选的 token 用量，
+    窗口未满时请求立即放行，不再按固定间隔逐个排队。
+    """
     
-    def __init__(self, rps: Optional[float]):
-        self.enabled = bool(rps) and rps > 0
-        self.interval = 1.0 / rps if self.enabled else 0.0
-        self._last = 0.0
+    WINDOW = 60.0
+    
+    def __init__(self, rps: Optional[float], tpm: Optional[int] = None):
+        self.rpm_limit = max(1, int(rps * self.WINDOW)) if rps and rps > 0 else 0
+        self.tpm_limit = tpm if tpm and tpm > 0 else 0
+        self.enabled = bool(self.rpm_limit or self.tpm_limit)
+        self._requests: deque = deque()
+        self._tokens: deque = deque()  # (时间戳, token 数)
+        self._token_total = 0
+        self._paused_until = 0.0
         self._lock = asyncio.Lock()
 
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.WINDOW
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._token_total -= self._tokens.popleft()[1]
+
     async def wait(self) -> None:
-        if not self.enabled:
+        if not self.enabled and not self._paused_until:
             return
         async with self._lock:
-            now = time.monotonic()
-            elapsed = now - self._last
-            if elapsed < self.interval:
-                await asyncio.sleep(self.interval - elapsed)
-            self._last = time.monotonic()
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                delay = self._paused_until - now
+                if self.rpm_limit and len(self._requests) >= self.rpm_limit:
+                    delay = self._requests[0] + self.WINDOW - now
+                if self.tpm_limit and self._token_total >= self.tpm_limit:
+                    delay = max(delay, self._tokens[0][0] + self.WINDOW - now)
+                if delay <= 0:
+                    self._requests.append(now)
+                    return
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """在 seconds 秒内暂停放行新请求（与已有暂停取较晚者）"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers: Any) -> None:
+        """根据响应头中的剩余配额提前降速：剩余不足上限的 10% 时暂停 1 秒"""
+        remaining = _header_number(headers, REMAINING_HEADERS)
+        if remaining is None:
+            return
+        limit = _header_number(headers, LIMIT_HEADERS) or self.rpm_limit
+        if limit and remaining < 0.1 * limit:
+            self.pause(1.0)
+
+    def record_tokens(self, count: int) -> None:
+        """记录一次响应消耗的 token 数（usage.total_tokens）"""
+        if self.tpm_limit and count > 0:
+            self._tokens.append((time.monotonic(), count))
+            self._token_total += count
+
+
+class AdmissionController:
+    """AIMD 自适应并发控制
+
+    成功时并发上限加 0.5（不超过 max_concurrency）；请求失败，或最近请求的
+    平均延迟超过 target_latency 时减半（不低于 min_concurrency）。
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        target_latency: Optional[float] = None,
+        window: int = 20,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.target_latency = target_latency
+        self.latencies: deque = deque(maxlen=window)
+        self.active = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+
+    async def release(self, latency: Optional[float] = None, ok: bool = True) -> None:
+        async with self._cond:
+            self.active -= 1
+            if ok and latency is not None:
+                self.latencies.append(latency)
+            overloaded = (
+                self.target_latency is not None
+                and self.latencies
+                and sum(self.latencies) / len(self.latencies) > self.target_latency
+            )
+            if not ok or overloaded:
+                self.limit = max(float(self.min_concurrency), self.limit * 0.5)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 0.5)
+            self._cond.notify_all()
 
 
 def strip_code_fences(s: str) -> str:
@@ -100,40 +230,32 @@ def strip_code_fences(s: str) -> str:
     return s
 
 
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _find_json_array(s: str) -> Optional[Tuple[str, List[Any]]]:
+    """
+    从第一个 "[" 起逐个尝试 raw_decode，返回首个完整 JSON 数组的 (原文, 解析结果)
+
+    raw_decode 只解析到该值结束处，每个候选位置至多解析一次，
+    不再对同一段文本反复整体解析。
+    """
+    i = s.find("[")
+    while i != -1:
+        try:
+            obj, end = _JSON_DECODER.raw_decode(s, i)
+        except json.JSONDecodeError:
+            obj = None
+        if isinstance(obj, list):
+            return s[i:end], obj
+        i = s.find("[", i + 1)
+    return None
+
+
 def extract_json_array(s: str) -> Optional[str]:
     """从文本中提取 JSON 数组"""
-    s = strip_code_fences(s)
-    first = s.find("[")
-    last = s.rfind("]")
-    
-    if first == -1 or last == -1 or last <= first:
-        return None
-        
-    candidate = s[first:last + 1]
-    try:
-        json.loads(candidate)
-        return candidate
-    except json.JSONDecodeError:
-        pass
-        
-    # 尝试逐字符匹配
-    depth = 0
-    start = -1
-    for i, ch in enumerate(s):
-        if ch == "[":
-            if depth == 0:
-                start = i
-            depth += 1
-        elif ch == "]":
-            depth -= 1
-            if depth == 0 and start != -1:
-                segment = s[start:i + 1]
-                try:
-                    json.loads(segment)
-                    return segment
-                except json.JSONDecodeError:
-                    continue
-    return None
+    found = _find_json_array(strip_code_fences(s))
+    return found[0] if found else None
 
 
 def sanitize_items(obj: Any) -> List[Dict[str, Any]]:
@@ -169,22 +291,20 @@ def sanitize_items(obj: Any) -> List[Dict[str, Any]]:
 
 def parse_output(text: str) -> List[Dict[str, Any]]:
     """解析模型输出"""
-    arr_text = extract_json_array(text)
-    if arr_text:
-        try:
-            return sanitize_items(json.loads(arr_text))
-        except json.JSONDecodeError:
-            pass
+    text = strip_code_fences(text)
+    found = _find_json_array(text)
+    if found:
+        return sanitize_items(found[1])
     try:
-        return sanitize_items(json.loads(strip_code_fences(text)))
+        return sanitize_items(_loads(text))
     except json.JSONDecodeError:
         return []
 
 
 def append_jsonl(path: str, obj: Dict[str, Any]) -> None:
     """追加一行到 JSONL 文件"""
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    with open(path, "ab") as f:
+        f.write(_dumps(obj, newline=True))
 
 
 def load_done_batches(path: str) -> set:
@@ -193,13 +313,13 @@ def load_done_batches(path: str) -> set:
     if not os.path.exists(path):
         return done
     try:
-        with open(path, "r", encoding="utf-8") as f:
+        with open(path, "rb") as f:
             for line in f:
                 line = line.strip()
                 if not line:
                     continue
                 try:
-                    obj = json.loads(line)
+                    obj = _loads(line)
                     bi = obj.get("batchIndex")
                     if isinstance(bi, int):
                         done.add(bi)
@@ -210,36 +330,140 @@ def load_done_batches(path: str) -> set:
     return done
 
 
+def build_request_body(config: APIConfig, messages: List[Dict[str, Any]]) -> bytes:
+    """把请求体编码为 JSON 字节串，重试时可直接复用"""
+    return _dumps({
+        "model": config.model,
+        "messages": messages,
+        "temperature": 0,
+    })
+
+
 async def call_api(
     session, 
     config: APIConfig, 
-    messages: List[Dict[str, Any]]
+    messages: List[Dict[str, Any]],
+    limiter: Optional[RateLimiter] = None,
+) -> str:
+    """调用 OpenAI 兼容 API（传入 limiter 时记录 token 用量并根据响应头降速）"""
+    return await call_api_body(session, config, build_request_body(config, messages), limiter)
+
+
+async def call_api_body(
+    session,
+    config: APIConfig,
+    body: bytes,
+    limiter: Optional[RateLimiter] = None,
 ) -> str:
-    """调用 OpenAI 兼容 API"""
+    """
+    以 build_request_body 预先编码的请求体调用 API，重试时可复用同一份字节串
+
+    HTTP 429 抛出 RateLimitedError，携带 Retry-After 秒数。
+    """
     url = config.base_url.rstrip("/") + "/chat/completions"
     headers = {
         "Authorization": f"Bearer {config.api_key}",
         "Content-Type": "application/json",
     }
-    payload = {
-        "model": config.model,
-        "messages": messages,
-        "temperature": 0,
-    }
     
-    async with session.post(url, headers=headers, json=payload) as resp:
-        body = await resp.text()
+    async with session.post(url, headers=headers, data=body) as resp:
+        text = await resp.text()
+        if limiter is not None:
+            limiter.observe_headers(resp.headers)
+        if resp.status == 429:
+            raise RateLimitedError(
+                f"HTTP 429: {text[:400]}",
+                _header_number(resp.headers, ("retry-after",)),
+            )
         if resp.status != 200:
-            raise RuntimeError(f"HTTP {resp.status}: {body[:400]}")
+            raise RuntimeError(f"HTTP {resp.status}: {text[:400]}")
         try:
-            data = json.loads(body)
+            data = _loads(text)
         except json.JSONDecodeError as e:
             raise RuntimeError(f"Invalid JSON: {e}")
+        if limiter is not None:
+            usage = data.get("usage") or {}
+            limiter.record_tokens(int(usage.get("total_tokens") or 0))
         choice = (data.get("choices") or [{}])[0]
         msg = choice.get("message") or {}
         return str(msg.get("content") or choice.get("text") or "")
 
 
+# 多进程聚合的最小文件大小：文件较小时进程启动和结果回传开销大于收益
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024
+
+
+def _aggregate_range(path: str, start: int, end: int) -> Dict[int, List[Dict[str, Any]]]:
+    """解析 [start, end) 字节范围内的批次记录（范围边界须位于行首）"""
+    results: Dict[int, List[Dict[str, Any]]] = {}
+    if start >= end:
+        return results
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        # 按 memoryview 切片解析，省去逐行复制
+        view = memoryview(m)
+        line = None
+        try:
+            pos = start
+            while pos < end:
+                nl = m.find(b"\n", pos, end)
+                if nl < 0:
+                    nl = end
+                line = view[pos:nl]
+                pos = nl + 1
+                if not line:
+                    continue
+                try:
+                    obj = _loads(line)  # 仅含空白的行同样解析失败而被跳过
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(obj, dict):
+                    continue
+                bi = obj.get("batchIndex")
+                out = obj.get("output")
+                if isinstance(bi, int) and isinstance(out, list):
+                    results[bi] = sanitize_items(out)
+        finally:
+            # mmap 关闭前须释放所有切片视图
+            line = None
+            view.release()
+    return results
+
+
+def _split_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """把文件切分为约 parts 段按行对齐的字节范围"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, bounds[-1]))
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                f.readline()  # 跳到下一行行首（恰在行首时不跳过该行）
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def aggregate_batches(path: str, workers: int = 1) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    读取批次 JSONL，返回 batchIndex → 清理后的输出
+
+    同一批次出现多次时以文件中最后一条为准。workers > 1 且文件不小于
+    MIN_PARALLEL_BYTES 时按行对齐切分为多段，由多进程分别解析。
+    """
+    if workers <= 1 or os.path.getsize(path) < MIN_PARALLEL_BYTES:
+        return _aggregate_range(path, 0, os.path.getsize(path))
+
+    ranges = _split_ranges(path, workers)
+    results: Dict[int, List[Dict[str, Any]]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(_aggregate_range, path, start, end) for start, end in ranges]
+        # 按文件顺序合并，保持“后出现者覆盖”的语义
+        for fut in futures:
+            results.update(fut.result())
+    return results
+
+
 async def run_batches(
     config: APIConfig,
     system_prompt: str,
@@ -252,8 +476,11 @@ async def run_batches(
     rate_limit: Optional[float],
     resume: bool,
     quiet: bool,
+    target_latency: Optional[float] = None,
+    tpm_limit: Optional[int] = None,
+    workers: int = 1,
 ) -> None:
-    """运行批量清洗"""
+    """运行批量清洗（workers 为最终聚合批次结果的进程数）"""
     ensure_dir(batch_jsonl)
     ensure_dir(output_json)
 
@@ -261,8 +488,8 @@ async def run_batches(
     total = len(batches)
     done = load_done_batches(batch_jsonl) if resume else set()
 
-    sem = asyncio.Semaphore(max_concurrency)
-    limiter = RateLimiter(rate_limit)
+    admission = AdmissionController(max_concurrency, target_latency=target_latency)
+    limiter = RateLimiter(rate_limit, tpm_limit)
     write_lock = asyncio.Lock()
 
     import aiohttp
@@ -277,38 +504,42 @@ async def run_batches(
         async with write_lock:
             append_jsonl(path, obj)
 
+    # system 消息对所有批次相同，只构造一次
+    system_message = {"role": "system", "content": system_prompt}
+
     async with aiohttp.ClientSession(timeout=timeout) as session:
         async def worker(batch_idx: int, batch_items: List[Dict[str, Any]]) -> None:
-            if resume and batch_idx in done:
-                log(f"SKIP batch {batch_idx + 1}/{total} (已完成)")
-                return
-
             tag = f"batch_{batch_idx + 1:04d}"
+            # 请求体只编码一次，各次重试复用同一份字节串
+            body = build_request_body(config, [
+                system_message,
+                {"role": "user", "content": _dumps(batch_items).decode("utf-8")},
+            ])
             
             for attempt in range(1, retries + 1):
+                await admission.acquire()
+                released = False
                 try:
-                    async with sem:
-                        await limiter.wait()
-                        log(f"→ {tag} size={len(batch_items)} attempt {attempt}/{retries}")
-                        
-                        messages = [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": json.dumps(batch_items, ensure_ascii=False)},
-                        ]
-                        
-                        content = await call_api(session, config, messages)
-                        arr = parse_output(content)
-                        
-                        await append_safe(batch_jsonl, {
-                            "batchIndex": batch_idx,
-                            "inputCount": len(batch_items),
-                            "output": arr
-                        })
-                        
-                        log(f"✓ {tag} output={len(arr)}")
-                    return
+                    await limiter.wait()
+                    log(f"→ {tag} size={len(batch_items)} attempt {attempt}/{retries}")
+                    started = time.monotonic()
+                    content = await call_api_body(session, config, body, limiter)
+                    # 请求完成即归还名额，解析与落盘不计入延迟
+                    await admission.release(time.monotonic() - started, ok=True)
+                    released = True
+                    
+                    arr = parse_output(content)
+                    await append_safe(batch_jsonl, {
+                        "batchIndex": batch_idx,
+                        "inputCount": len(batch_items),
+                        "output": arr
+                    })
                     
+                    log(f"✓ {tag} output={len(arr)}")
+                    return
                 except Exception as e:
+                    if not released:
+                        await admission.release(ok=False)
                     if attempt >= retries:
                         await append_safe(batch_jsonl + ".errors.jsonl", {
                             "batchIndex": batch_idx,
@@ -317,27 +548,25 @@ async def run_batches(
                         log(f"✗ {tag} 失败: {str(e)[:200]}")
                         return
                     backoff = 2 ** (attempt - 1)
+                    if isinstance(e, RateLimitedError) and e.retry_after is not None:
+                        # 按服务端要求等待，并让其他 worker 同样暂停
+                        backoff = e.retry_after
+                        limiter.pause(backoff)
                     log(f"! {tag} 重试 in {backoff}s: {str(e)[:200]}")
                     await asyncio.sleep(backoff)
 
-        await asyncio.gather(*(
-            worker(i, b) for i, b in enumerate(batches)
-        ))
+        def jobs():
+            for i, b in enumerate(batches):
+                if resume and i in done:
+                    log(f"SKIP batch {i + 1}/{total} (已完成)")
+                    continue
+                yield worker(i, b)
+
+        # 只保留有限数量的在途任务，避免大量批次一次性创建协程
+        await run_bounded(jobs(), max(1, max_concurrency) * 2)
 
     # 聚合结果
-    results_by_batch: Dict[int, List[Dict[str, Any]]] = {}
-    for line in open(batch_jsonl, "r", encoding="utf-8"):
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            obj = json.loads(line)
-            bi = obj.get("batchIndex")
-            out = obj.get("output")
-            if isinstance(bi, int) and isinstance(out, list):
-                results_by_batch[bi] = sanitize_items(out)
-        except json.JSONDecodeError:
-            continue
+    results_by_batch = aggregate_batches(batch_jsonl, workers)
 
     merged: List[Dict[str, Any]] = []
     for i in range(total):
@@ -345,8 +574,8 @@ async def run_batches(
         if batch_items:
             merged.extend(batch_items)
 
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(merged, f, ensure_ascii=False, indent=2)
+    with open(output_json, "wb") as f:
+        f.write(_dumps(merged, indent=True))
 
     print(f"✓ 清洗完成: {output_json} ({len(merged)} 条记录)")
 
@@ -391,7 +620,30 @@ def main() -> None:
     parser.add_argument("--max-concurrency", type=int, default=8)
     parser.add_argument("--retries", type=int, default=3)
     parser.add_argument("--timeout", type=float, default=60.0)
-    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="请求速率上限（每秒），按 60 秒滑动窗口折算为每分钟请求数"
+    )
+    parser.add_argument(
+        "--tpm-limit",
+        type=int,
+        default=None,
+        help="每分钟 token 上限（按响应中的 usage.total_tokens 统计）"
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=float,
+        default=None,
+        help="目标请求延迟（秒）；近期平均延迟超过该值时自动减半并发"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"聚合批次结果的进程数（默认: 1；批次文件不小于 {MIN_PARALLEL_BYTES // (1024 * 1024)}MB 时生效）"
+    )
     parser.add_argument("--resume", action="store_true", help="从上次中断处继续")
     parser.add_argument("--quiet", action="store_true")
     args = parser.parse_args()
@@ -434,6 +686,9 @@ def main() -> None:
         rate_limit=args.rate_limit,
         resume=args.resume,
         quiet=args.quiet,
+        target_latency=args.target_latency,
+        tpm_limit=args.tpm_limit,
+        workers=args.workers,
     ))
 
 
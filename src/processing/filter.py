@@ -20,7 +20,18 @@ from __future__ import annotations
 import argparse
 import json
 import os
-from typing import Any, Dict, List, Set
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick 为可选依赖，未安装时使用预编译正则
+    ahocorasick = None
+
+try:
+    import re2
+except ImportError:  # google-re2 为可选依赖，未安装时使用标准库 re
+    re2 = None
 
 
 # 省级行政区名称集合
@@ -47,9 +58,26 @@ UNKNOWN_MARKERS: Set[str] = {
 }
 
 
+def _build_marker_matcher():
+    """构建一次扫描即可判断是否命中任一标记的匹配器"""
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for marker in UNKNOWN_MARKERS:
+            automaton.add_word(marker, marker)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    # 长标记在前，正则交替分支在 C 层单次扫描完成；re2 编译为 DFA，线性时间且无回溯
+    source = "|".join(map(re.escape, sorted(UNKNOWN_MARKERS, key=len, reverse=True)))
+    pattern = (re2 or re).compile(source)
+    return lambda text: pattern.search(text) is not None
+
+
+_has_marker = _build_marker_matcher()
+
+
 def contains_unknown(text: str) -> bool:
     """检查文本是否包含无效标记"""
-    return any(marker in text for marker in UNKNOWN_MARKERS)
+    return _has_marker(text)
 
 
 def is_province_only(address: str) -> bool:
@@ -76,10 +104,14 @@ def should_drop(item: Dict[str, Any]) -> bool:
     return False
 
 
-def filter_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """过滤地点列表"""
-    filtered: List[Dict[str, Any]] = []
-    
+def iter_filtered(items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """逐条过滤地点，产出规范化后的有效记录（可直接接入流式写出）
+
+    与 should_drop 规则相同，但每个字段只规范化一次，
+    标题和地址拼接后只做一次标记扫描（标记不含换行，拼接不会产生跨字段误判）。
+    """
+    has_marker = _has_marker
+    provinces = PROVINCE_LEVEL_ONLY
     for item in items:
         if not isinstance(item, dict):
             continue
@@ -87,18 +119,22 @@ def filter_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         # 规范化字段
         title = str(item.get("title", "")).strip()
         address = str(item.get("address", "")).strip()
-        synopsis = str(item.get("synopsis", "")).strip()
         
-        normalized = {
+        if not title or not address or address in provinces:
+            continue
+        if has_marker(title + "\n" + address):
+            continue
+        
+        yield {
             "title": title, 
             "address": address, 
-            "synopsis": synopsis
+            "synopsis": str(item.get("synopsis", "")).strip()
         }
-        
-        if not should_drop(normalized):
-            filtered.append(normalized)
-            
-    return filtered
+
+
+def filter_items(items: Iterable[Any]) -> List[Dict[str, Any]]:
+    """过滤地点列表"""
+    return list(iter_filtered(items))
 
 
 def main() -> None:
@@ -24,13 +24,41 @@ from __future__ import annotations
 import argparse
 import json
 import os
-from collections import Counter, OrderedDict
-from typing import Any, Dict, List
+import sys
+from typing import Any, Dict, Iterable, Iterator, List
+
+try:
+    from ..common.jsonio import dumps as _dumps, loads as _loads
+except ImportError:  # 以脚本方式运行或以 src 为导入根时没有上级包
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.jsonio import dumps as _dumps, loads as _loads
+
+try:
+    from ._merger_groups import group_outputs
+except ImportError:  # 以脚本方式运行时不在包内
+    from _merger_groups import group_outputs
+
+
+def write_json_array(path: str, items: Iterable[Dict[str, Any]]) -> int:
+    """
+    逐条写出 JSON 数组，不在内存中拼出完整的序列化结果
+    
+    Returns:
+        写出的条目数
+    """
+    count = 0
+    with open(path, "wb") as f:
+        for item in items:
+            f.write(b"[\n  " if count == 0 else b",\n  ")
+            f.write(_dumps(item, indent=True).replace(b"\n", b"\n  "))
+            count += 1
+        f.write(b"\n]" if count else b"[]")
+    return count
 
 
 def read_lines(path: str):
-    """逐行读取文件"""
-    with open(path, "r", encoding="utf-8") as f:
+    """以二进制逐行读取文件（bytes，跳过空行）"""
+    with open(path, "rb") as f:
         for line in f:
             line = line.strip()
             if not line:
@@ -39,98 +67,60 @@ def read_lines(path: str):
 
 
 def parse_jsonl(path: str):
-    """解析 JSONL 文件"""
+    """解析 JSONL 文件（bytes 直接交给解析器，省去逐行解码）"""
     for line in read_lines(path):
         try:
-            yield json.loads(line)
+            yield _loads(line)
         except json.JSONDecodeError:
             continue
 
 
-def merge_by_title(jsonl_path: str) -> List[Dict[str, Any]]:
+def iter_merged(jsonl_path: str) -> Iterator[Dict[str, Any]]:
     """
-    按 title 合并提取结果
+    按 title 合并提取结果，逐个产出合并后的地点
+    
+    同一 title 可能出现在文件任意位置，因此分组统计需读完整个输入；
+    产出阶段按组逐个构建，不再额外持有完整的结果列表。
     
     Args:
         jsonl_path: 输入 JSONL 文件路径
         
-    Returns:
-        合并后的地点列表
+    Yields:
+        合并后的地点（按 title 首次出现的顺序）
     """
-    groups: Dict[str, Dict[str, Any]] = {}
-
-    for obj in parse_jsonl(jsonl_path):
-        outputs = obj.get("output")
-        if not isinstance(outputs, list):
-            continue
-            
-        for item in outputs:
-            if not isinstance(item, dict):
-                continue
-                
-            title = item.get("title")
-            address = item.get("address")
-            story = item.get("story")
-            
-            # 验证字段类型
-            if not isinstance(title, str) or not isinstance(address, str) or not isinstance(story, str):
-                continue
-                
-            title_key = title.strip()
-            address_val = address.strip()
-            story_val = story.strip()
-            
-            if not title_key:
-                continue
+    # 分组内循环在 _merger_groups 中（可用 mypyc 编译）
+    title_to_idx, address_counters, stories_seen = group_outputs(parse_jsonl(jsonl_path))
 
-            # 获取或创建分组
-            g = groups.get(title_key)
-            if g is None:
-                g = {
-                    "title": title_key,
-                    "address_counter": Counter(),
-                    "address_first": None,
-                    "stories_seen": OrderedDict(),  # 保持插入顺序的去重集合
-                }
-                groups[title_key] = g
-
-            # 统计 address
-            if address_val:
-                g["address_counter"][address_val] += 1
-                if g["address_first"] is None:
-                    g["address_first"] = address_val
-                    
-            # 去重添加 story
-            if story_val and story_val not in g["stories_seen"]:
-                g["stories_seen"][story_val] = True
-
-    # 构建结果数组
-    result: List[Dict[str, Any]] = []
-    
-    for title_key, g in groups.items():
+    # 逐组构建结果
+    for title_key, idx in title_to_idx.items():
         # 选择最佳 address (多数投票)
         address = ""
-        if g["address_counter"]:
-            most_common = g["address_counter"].most_common()
-            max_count = most_common[0][1]
-            candidates = [addr for addr, cnt in most_common if cnt == max_count]
-            
-            if len(candidates) == 1:
-                address = candidates[0]
-            else:
-                # 平票时使用首次出现的
-                first = g["address_first"]
-                address = first if first in candidates else candidates[0]
-
-        stories = list(g["stories_seen"].keys())
+        counter = address_counters[idx]
+        if counter:
+            # 计数 dict 按首次出现顺序迭代，max 返回票数最多者中最先出现的一个，
+            # 即平票时使用首次出现的；单次线性扫描，无需 most_common 排序
+            address = max(counter, key=counter.__getitem__)
+
+        stories = list(stories_seen[idx])
         
-        result.append({
+        yield {
             "title": title_key,
             "address": address,
             "story": stories,
-        })
+        }
 
-    return result
+
+def merge_by_title(jsonl_path: str) -> List[Dict[str, Any]]:
+    """
+    按 title 合并提取结果
+    
+    Args:
+        jsonl_path: 输入 JSONL 文件路径
+        
+    Returns:
+        合并后的地点列表
+    """
+    return list(iter_merged(jsonl_path))
 
 
 def main() -> None:
@@ -149,14 +139,12 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    merged = merge_by_title(args.input)
-    
     os.makedirs(os.path.dirname(os.path.abspath(args.output)) or ".", exist_ok=True)
     
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(merged, f, ensure_ascii=False, indent=2)
+    # 边合并边写出
+    count = write_json_array(args.output, iter_merged(args.input))
         
-    print(f"✓ 合并完成: {args.output} ({len(merged)} 个唯一地点)")
+    print(f"✓ 合并完成: {args.output} ({count} 个唯一地点)")
 
 
 if __name__ == "__main__":